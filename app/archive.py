@@ -0,0 +1,354 @@
+from os import getenv
+from datetime import datetime, timedelta, timezone
+
+from celery import shared_task
+from fastapi import HTTPException
+from sqlalchemy import select, insert, delete, func, and_, or_, exists, union, union_all
+from sqlalchemy.orm import aliased
+
+from app.database import SyncSessionLocal
+from app.vote_hours import rebuild_vote_hours
+from app.trending import recount_scores, update_scores_sync
+from app.etag import bump_version
+from app.models import (
+    UserModel, DecisionModel, DecisionHistoryModel, DecisionVoteModel, CommentModel, CommentVoteModel,
+    UserArchiveModel, DecisionArchiveModel, DecisionHistoryArchiveModel, DecisionVoteArchiveModel,
+    CommentArchiveModel, CommentVoteArchiveModel
+)
+
+
+RETENTION_DAYS = int(getenv("ARCHIVE_RETENTION_DAYS", "30"))
+BATCH_SIZE = 500
+# восстановленная строка заново отсчитывает срок хранения, иначе следующий запуск унесет ее обратно
+RESTORED = {"deleted_at": func.now()}
+RESCORED = "rescored_hot_scores" #ключ db.info, см. rescored_scores
+
+
+def _move(db, source, target, where, **overrides) -> int:
+    """
+    Переносит строки source под условием where в target одним запросом:
+    WITH moved AS (DELETE ... RETURNING ...) INSERT INTO target SELECT ... FROM moved.
+    Переносятся колонки, которые есть в обеих таблицах, overrides подменяют значения
+    """
+    source_table, target_table = source.__table__, target.__table__
+    columns = [
+        column.name for column in target_table.c
+        if column.name in source_table.c and column.name not in overrides
+    ]
+    moved = (
+        delete(source_table)
+        .where(where)
+        .returning(*(source_table.c[name] for name in columns))
+        .cte("moved")
+    )
+    stmt = insert(target_table).from_select(
+        columns + list(overrides),
+        select(*(moved.c[name] for name in columns), *overrides.values())
+    )
+    return db.execute(stmt).rowcount
+
+
+def _expired(column, cutoff):
+    # строки, скрытые до появления deleted_at, считаем давно скрытыми
+    return or_(column.is_(None), column < cutoff)
+
+
+def _alive(column, model):
+    return column.in_(select(model.id))
+
+
+def _bump_touched(db, user_ids) -> None:
+    # голоса и комментарии пользователей видны в чужих решениях: сдвигаем их version для ETag
+    db.execute(bump_version(union(
+        select(DecisionVoteModel.decision_id).where(DecisionVoteModel.user_id.in_(user_ids)),
+        select(CommentModel.decision_id).where(CommentModel.user_id.in_(user_ids)),
+        select(CommentModel.decision_id)
+        .join(CommentVoteModel, CommentVoteModel.comment_id == CommentModel.id)
+        .where(CommentVoteModel.user_id.in_(user_ids)),
+    )))
+
+
+def rescore_decisions(db, decision_ids) -> None:
+    """
+    Голоса решений ушли мимо vote(): перенос между горячей и архивной таблицами, удаление пользователя.
+    В той же транзакции пересчитываем net_votes, hot_score и часовые корзины, как их сдвигает vote()
+    """
+    decision_ids = list(decision_ids)
+    if not decision_ids:
+        return
+    db.info.setdefault(RESCORED, {}).update(recount_scores(db, decision_ids))
+    rebuild_vote_hours(db, decision_ids)
+
+
+def rescored_scores(db) -> dict[int, float]:
+    """
+    Новые hot_score активных решений после rescore_decisions. Забирать после commit и отправлять в индекс trending
+    """
+    return db.info.pop(RESCORED, {})
+
+
+def _archive_decisions(db, cutoff: datetime, batch_size: int) -> int:
+    ids = db.scalars(
+        select(DecisionModel.id)
+        .where(DecisionModel.is_active.is_(False), _expired(DecisionModel.deleted_at, cutoff))
+        .order_by(DecisionModel.id)
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+    # сначала зависимые строки, иначе их удалит ON DELETE CASCADE
+    comments = select(CommentModel.id).where(CommentModel.decision_id.in_(ids))
+    _move(db, CommentVoteModel, CommentVoteArchiveModel, CommentVoteModel.comment_id.in_(comments))
+    _move(db, CommentModel, CommentArchiveModel, CommentModel.decision_id.in_(ids))
+    _move(db, DecisionVoteModel, DecisionVoteArchiveModel, DecisionVoteModel.decision_id.in_(ids))
+    _move(db, DecisionHistoryModel, DecisionHistoryArchiveModel, DecisionHistoryModel.decision_id.in_(ids))
+    return _move(db, DecisionModel, DecisionArchiveModel, DecisionModel.id.in_(ids))
+
+
+def _archive_history(db, cutoff: datetime, batch_size: int) -> int:
+    ids = (
+        select(DecisionHistoryModel.id)
+        .where(DecisionHistoryModel.is_active.is_(False), _expired(DecisionHistoryModel.deleted_at, cutoff))
+        .order_by(DecisionHistoryModel.id)
+        .limit(batch_size)
+    )
+    return _move(db, DecisionHistoryModel, DecisionHistoryArchiveModel, DecisionHistoryModel.id.in_(ids))
+
+
+def _archive_comments(db, cutoff: datetime, batch_size: int) -> int:
+    # комментарий с ответами в горячей таблице не трогаем: его удаление унесло бы ответы
+    reply = aliased(CommentModel)
+    no_replies = ~exists().where(reply.parent_id == CommentModel.id)
+    ids = db.scalars(
+        select(CommentModel.id)
+        .where(CommentModel.status.is_(False), _expired(CommentModel.deleted_at, cutoff), no_replies)
+        .order_by(CommentModel.id)
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+    _move(db, CommentVoteModel, CommentVoteArchiveModel, CommentVoteModel.comment_id.in_(ids))
+    return _move(db, CommentModel, CommentArchiveModel, and_(CommentModel.id.in_(ids), no_replies))
+
+
+def _archive_users(db, cutoff: datetime, batch_size: int) -> int:
+    # пользователь уходит в архив после всех своих решений и комментариев
+    ids = db.scalars(
+        select(UserModel.id)
+        .where(
+            UserModel.is_active.is_(False),
+            _expired(UserModel.deleted_at, cutoff),
+            ~exists().where(DecisionModel.user_id == UserModel.id),
+            ~exists().where(CommentModel.user_id == UserModel.id),
+        )
+        .order_by(UserModel.id)
+        .limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+    _bump_touched(db, ids)
+    voted = db.scalars(
+        select(DecisionVoteModel.decision_id).where(DecisionVoteModel.user_id.in_(ids)).distinct()
+    ).all()
+    _move(db, CommentVoteModel, CommentVoteArchiveModel, CommentVoteModel.user_id.in_(ids))
+    _move(db, DecisionVoteModel, DecisionVoteArchiveModel, DecisionVoteModel.user_id.in_(ids))
+    rescore_decisions(db, voted)
+    return _move(db, UserModel, UserArchiveModel, UserModel.id.in_(ids))
+
+
+ARCHIVE_STAGES = (
+    ("decisions", _archive_decisions),
+    ("decision_history", _archive_history),
+    ("comments", _archive_comments),
+    ("users", _archive_users),
+)
+
+
+def archive_soft_deleted(retention_days: int = RETENTION_DAYS, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Переносит в *_archive строки, скрытые раньше чем retention_days дней назад.
+    Каждая пачка в своей транзакции, прерванный запуск просто продолжится в следующий раз
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    report = {}
+    db = SyncSessionLocal()
+    try:
+        for name, archive_batch in ARCHIVE_STAGES:
+            report[name] = 0
+            while moved := archive_batch(db, cutoff, batch_size):
+                db.commit()
+                update_scores_sync(rescored_scores(db))
+                report[name] += moved
+            db.commit()
+    finally:
+        db.close()
+    return report
+
+
+@shared_task
+def archive_soft_deleted_rows():
+    return archive_soft_deleted()
+
+
+def _restore_comments(db, where) -> int:
+    """
+    Комментарии возвращаются по уровням дерева: ответ только после родителя,
+    и только если автор и решение уже в горячих таблицах
+    """
+    restored = 0
+    condition = and_(
+        where,
+        _alive(CommentArchiveModel.user_id, UserModel),
+        _alive(CommentArchiveModel.decision_id, DecisionModel),
+        or_(CommentArchiveModel.parent_id.is_(None), _alive(CommentArchiveModel.parent_id, CommentModel)),
+    )
+    while moved := _move(db, CommentArchiveModel, CommentModel, condition, **RESTORED):
+        restored += moved
+    return restored
+
+
+def _restore_votes(db, decision_votes, comment_votes) -> None:
+    _move(db, DecisionVoteArchiveModel, DecisionVoteModel, and_(
+        decision_votes,
+        _alive(DecisionVoteArchiveModel.user_id, UserModel),
+        _alive(DecisionVoteArchiveModel.decision_id, DecisionModel),
+    ))
+    _move(db, CommentVoteArchiveModel, CommentVoteModel, and_(
+        comment_votes,
+        _alive(CommentVoteArchiveModel.user_id, UserModel),
+        _alive(CommentVoteArchiveModel.comment_id, CommentModel),
+    ))
+
+
+def _restore_decisions(db, decision_ids: list[int]) -> None:
+    _move(db, DecisionArchiveModel, DecisionModel, DecisionArchiveModel.id.in_(decision_ids), **RESTORED)
+    _move(
+        db, DecisionHistoryArchiveModel, DecisionHistoryModel,
+        DecisionHistoryArchiveModel.decision_id.in_(decision_ids), **RESTORED
+    )
+    _restore_comments(db, CommentArchiveModel.decision_id.in_(decision_ids))
+    _restore_votes(
+        db,
+        DecisionVoteArchiveModel.decision_id.in_(decision_ids),
+        CommentVoteArchiveModel.comment_id.in_(
+            select(CommentModel.id).where(CommentModel.decision_id.in_(decision_ids))
+        ),
+    )
+    # корзины удалил ON DELETE CASCADE при архивации, а голоса архивных пользователей не вернулись
+    rescore_decisions(db, decision_ids)
+
+
+def restore_decision(db, decision_id: int) -> None:
+    """
+    Возвращает решение из архива вместе с историями, комментариями и голосами.
+    Решение остается скрытым, как было до архивации. После commit - rescored_scores
+    """
+    user_id = db.scalar(select(DecisionArchiveModel.user_id).where(DecisionArchiveModel.id == decision_id))
+    if user_id is None:
+        raise HTTPException(404, "Решение не найдено в архиве")
+    if db.scalar(select(UserModel.id).where(UserModel.id == user_id)) is None:
+        raise HTTPException(409, "Сначала восстановите автора решения")
+    _restore_decisions(db, [decision_id])
+
+
+def restore_user(db, user_id: int) -> None:
+    """
+    Возвращает пользователя из архива, его решения, комментарии и голоса. После commit - rescored_scores
+    """
+    if not _move(db, UserArchiveModel, UserModel, UserArchiveModel.id == user_id, **RESTORED):
+        raise HTTPException(404, "Пользователь не найден в архиве")
+    decision_ids = db.scalars(
+        select(DecisionArchiveModel.id).where(DecisionArchiveModel.user_id == user_id)
+    ).all()
+    if decision_ids:
+        _restore_decisions(db, decision_ids)
+    _restore_comments(db, CommentArchiveModel.user_id == user_id)
+    _restore_votes(db, DecisionVoteArchiveModel.user_id == user_id, CommentVoteArchiveModel.user_id == user_id)
+    rescore_decisions(db, db.scalars(
+        select(DecisionVoteModel.decision_id).where(DecisionVoteModel.user_id == user_id).distinct()
+    ).all())
+    _bump_touched(db, [user_id])
+
+
+def user_role(db, user_id: int) -> str | None:
+    """
+    Роль пользователя из горячей таблицы или из архива
+    """
+    return db.scalar(
+        union(
+            select(UserModel.role).where(UserModel.id == user_id),
+            select(UserArchiveModel.role).where(UserArchiveModel.id == user_id),
+        ).limit(1)
+    )
+
+
+def decision_owner(db, decision_id: int) -> int | None:
+    return db.scalar(
+        union(
+            select(DecisionModel.user_id).where(DecisionModel.id == decision_id),
+            select(DecisionArchiveModel.user_id).where(DecisionArchiveModel.id == decision_id),
+        ).limit(1)
+    )
+
+
+def _comment_tree(seed):
+    """
+    id комментариев seed и всех ответов на них, по горячей и архивной таблицам
+    """
+    edges = union_all(
+        select(CommentModel.id, CommentModel.parent_id),
+        select(CommentArchiveModel.id, CommentArchiveModel.parent_id),
+    ).subquery()
+    tree = select(edges.c.id).where(seed(edges)).cte("tree", recursive=True)
+    tree = tree.union_all(select(edges.c.id).join(tree, edges.c.parent_id == tree.c.id))
+    return select(tree.c.id)
+
+
+def delete_archived_comments(db, seed) -> None:
+    """
+    Удаляет из архива комментарии-потомки seed и голоса за них.
+    Вызывать до удаления из горячих таблиц, пока дерево еще целое
+    """
+    tree = _comment_tree(seed)
+    db.execute(delete(CommentVoteArchiveModel).where(CommentVoteArchiveModel.comment_id.in_(tree)))
+    db.execute(delete(CommentArchiveModel).where(CommentArchiveModel.id.in_(tree)))
+
+
+def delete_archived_decisions(db, decision_ids) -> list[str]:
+    """
+    Удаляет из архива решения и все, что к ним относится. Возвращает image_url для release_images
+    """
+    delete_archived_comments(db, lambda edges: edges.c.id.in_(union(
+        select(CommentModel.id).where(CommentModel.decision_id.in_(decision_ids)),
+        select(CommentArchiveModel.id).where(CommentArchiveModel.decision_id.in_(decision_ids)),
+    )))
+    db.execute(delete(DecisionVoteArchiveModel).where(DecisionVoteArchiveModel.decision_id.in_(decision_ids)))
+    history = db.scalars(
+        delete(DecisionHistoryArchiveModel)
+        .where(DecisionHistoryArchiveModel.decision_id.in_(decision_ids))
+        .returning(DecisionHistoryArchiveModel.image_url)
+    ).all()
+    decisions = db.scalars(
+        delete(DecisionArchiveModel)
+        .where(DecisionArchiveModel.id.in_(decision_ids))
+        .returning(DecisionArchiveModel.image_url)
+    ).all()
+    return [*history, *decisions]
+
+
+def delete_archived_user(db, user_id: int) -> list[str]:
+    """
+    Удаляет из архива все строки пользователя, включая контент его решений
+    """
+    image_urls = delete_archived_decisions(db, union(
+        select(DecisionModel.id).where(DecisionModel.user_id == user_id),
+        select(DecisionArchiveModel.id).where(DecisionArchiveModel.user_id == user_id),
+    ))
+    delete_archived_comments(db, lambda edges: edges.c.id.in_(union(
+        select(CommentModel.id).where(CommentModel.user_id == user_id),
+        select(CommentArchiveModel.id).where(CommentArchiveModel.user_id == user_id),
+    )))
+    db.execute(delete(DecisionVoteArchiveModel).where(DecisionVoteArchiveModel.user_id == user_id))
+    db.execute(delete(CommentVoteArchiveModel).where(CommentVoteArchiveModel.user_id == user_id))
+    db.execute(delete(UserArchiveModel).where(UserArchiveModel.id == user_id))
+    return image_urls
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from app.database import async_session_maker
+from app import decision_repo
+
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBroadcaster:
+    """
+    Рассылает подписчикам счетчики лайков/дизлайков решений.
+    Обновления склеиваются: не чаще одного сообщения на решение за interval секунд,
+    счетчики всех изменившихся решений считаются одним запросом на тик.
+    """
+
+    def __init__(self, interval: float = 0.25):
+        self.interval = interval
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._dirty: set[int] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def publish(self, decision_id: int) -> None:
+        """
+        Помечает решение измененным. Дешево, можно вызывать на каждый голос
+        """
+        if decision_id not in self._subscribers:
+            return
+        self._dirty.add(decision_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def subscribe(self, decision_id: int) -> asyncio.Queue:
+        # maxsize=1: медленный клиент получает только последнее значение
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers[decision_id].add(queue)
+        return queue
+
+    def unsubscribe(self, decision_id: int, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(decision_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[decision_id]
+            self._dirty.discard(decision_id)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            dirty, self._dirty = self._dirty, set()
+            dirty &= self._subscribers.keys()
+            if dirty:
+                try:
+                    tallies = await self._load_tallies(dirty)
+                except Exception:
+                    logger.exception("Ошибка рассылки голосов для решений %s", sorted(dirty))
+                    self._dirty |= dirty
+                else:
+                    for decision_id in dirty:
+                        like, dislike = tallies.get(decision_id, (0, 0))
+                        self._fan_out(decision_id, {"decision_id": decision_id, "like": like, "dislike": dislike})
+            await asyncio.sleep(self.interval)
+
+    def _fan_out(self, decision_id: int, message: dict) -> None:
+        for queue in self._subscribers.get(decision_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def _load_tallies(self, decision_ids: set[int]) -> dict[int, tuple[int, int]]:
+        async with async_session_maker() as session:
+            return await decision_repo.vote_counts_many(session, decision_ids)
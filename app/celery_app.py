@@ -1,8 +1,5 @@
 from celery import Celery
-
-
-
-from celery import Celery
+from celery.schedules import crontab
 
 def create_celery_app():
     # Создаем экземпляр
@@ -10,14 +7,32 @@ def create_celery_app():
         "decisionshub",
         broker="redis://127.0.0.1:6379/0",
         backend="redis://127.0.0.1:6379/0",
-        include=["app.utilits"]  # Путь к  задачи
+        include=["app.utilits", "app.image_variants", "app.media_gc", "app.user_jobs", "app.archive", "app.decision_stats", "app.leaderboard", "app.vote_hours"]  # Путь к  задачи
     )
 
     # Применяем настройки
     instance.conf.update(
         task_track_started=True, #вкл статус старт для задач
         broker_connection_retry_on_startup=True, #повторяет подкл
-        worker_prefetch_multiplier=1  # Важно для стабильности на Windows
+        worker_prefetch_multiplier=1,  # Важно для стабильности на Windows
+        beat_schedule={ # периодические задачи, запуск: celery -A app.celery_app beat
+            "collect-media-garbage": {
+                "task": "app.media_gc.collect_media_garbage",
+                "schedule": crontab(hour=4, minute=0),
+            },
+            "archive-soft-deleted": {
+                "task": "app.archive.archive_soft_deleted_rows",
+                "schedule": crontab(hour=3, minute=30),
+            },
+            "refresh-decision-stats": {
+                "task": "app.decision_stats.refresh_decision_stats",
+                "schedule": 5 * 60, #секунды
+            },
+            "snapshot-leaderboard": {
+                "task": "app.leaderboard.snapshot_leaderboard",
+                "schedule": 5 * 60,
+            },
+        },
     )
     return instance
 
@@ -0,0 +1,159 @@
+import gzip
+
+from os import getenv
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError: #br отдаем только если установлен пакет brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError: #zstd - если установлен пакет zstandard
+    zstandard = None
+
+
+load_dotenv()
+
+MINIMUM_SIZE = int(getenv("COMPRESSION_MINIMUM_SIZE", "1024")) #меньше - заголовки съедят выигрыш
+THREADPOOL_SIZE = int(getenv("COMPRESSION_THREADPOOL_SIZE", "65536")) #больше - сжимаем не в event loop
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4 #по умолчанию 11, слишком медленно для ответов API
+ZSTD_LEVEL = 3
+
+# JSON списков сжимается в разы, картинки и архивы уже сжаты
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+def _zstd(body: bytes) -> bytes:
+    # ZstdCompressor нельзя делить между потоками
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+
+
+# по убыванию предпочтения при равном q
+ENCODERS = {
+    name: encoder
+    for name, encoder, available in (
+        ("zstd", _zstd, zstandard is not None),
+        ("br", _brotli, brotli is not None),
+        ("gzip", _gzip, True),
+    )
+    if available
+}
+
+
+def negotiate(accept_encoding: str) -> str | None:
+    """
+    Кодировка из Accept-Encoding с учетом q и *, None если сжимать нечем
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def no_compression(endpoint):
+    """
+    Отключает сжатие ответов ручки
+    """
+    endpoint.skip_compression = True
+    return endpoint
+
+
+def compressible(scope, headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    if getattr(scope.get("endpoint"), "skip_compression", False):
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware:
+    """
+    Сжатие gzip/br/zstd по Accept-Encoding. Сжимается только ответ, пришедший одним куском:
+    StreamingResponse, SSE и файлы уходят как есть. Большие тела сжимаются в пуле потоков
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE, threadpool_size: int = THREADPOOL_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.threadpool_size = threadpool_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        decided = False
+
+        async def send_compressed(message):
+            nonlocal start, decided
+            if decided:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message #заголовки держим до первого куска тела
+                return
+            decided = True
+            headers = MutableHeaders(raw=start["headers"])
+            if message["type"] != "http.response.body" or not compressible(scope, headers):
+                await send(start)
+                await send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+            encoder = ENCODERS[encoding]
+            if len(body) >= self.threadpool_size:
+                body = await run_in_threadpool(encoder, body)
+            else:
+                body = encoder(body)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,6 +1,7 @@
 from os import getenv
 from dotenv import load_dotenv
 from app.validation.jwt_manager import JWTManager
+from app.broadcast import VoteBroadcaster
 
 
 load_dotenv()
@@ -8,10 +9,14 @@ SECRET_KEY = getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCES_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
+VOTE_BROADCAST_INTERVAL = float(getenv("VOTE_BROADCAST_INTERVAL", "0.25")) #секунды между рассылками счетчиков
+MEDIA_ACCEL_REDIRECT = getenv("MEDIA_ACCEL_REDIRECT") #internal location nginx, например /protected-media/
 
 jwt_manager = JWTManager(
     secret_key=SECRET_KEY,
     algorithm = ALGORITHM,
     acces_token_expire_minutes=ACCES_TOKEN_EXPIRE_MINUTES,
     refresh_token_expire_days=REFRESH_TOKEN_EXPIRE_DAYS
-)
\ No newline at end of file
+)
+
+vote_broadcaster = VoteBroadcaster(interval=VOTE_BROADCAST_INTERVAL)
\ No newline at end of file
@@ -0,0 +1,101 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class DataLoader:
+    """
+    Загрузка строк одной модели по первичному ключу. Ключи, запрошенные за один тик
+    event loop (load_many или gather), уходят одним SELECT ... WHERE id IN (...),
+    результаты кешируются до конца запроса. Последовательные await load - по запросу на ключ.
+    Строки, уже лежащие в сессии (например current_user), берутся без запроса
+    """
+
+    def __init__(self, loaders: "Loaders", model):
+        self.loaders = loaders
+        self.model = model
+        self.cache: dict[int, asyncio.Future] = {}
+        self.pending: list[int] = []
+        self.tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: int):
+        future = self.cache.get(key)
+        if future is None:
+            future = self._schedule(key)
+        # shield: отмена одного ожидающего не отменяет загрузку для остальных
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys) -> list:
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def _schedule(self, key: int) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.cache[key] = future
+        row = self.loaders.db.identity_map.get(identity_key(self.model, key))
+        if row is not None:
+            future.set_result(row)
+            return future
+        if not self.pending:
+            # запрос уйдет после того, как остальные корутины этого тика добавят свои ключи
+            loop.call_soon(self._start_dispatch)
+        self.pending.append(key)
+        return future
+
+    def _start_dispatch(self) -> None:
+        task = asyncio.ensure_future(self._dispatch())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _dispatch(self) -> None:
+        keys, self.pending = self.pending, []
+        try:
+            async with self.loaders.lock: #одна AsyncSession не выполняет запросы параллельно
+                rows = (await self.loaders.db.scalars(
+                    select(self.model).where(self.model.id.in_(keys))
+                )).all()
+        except BaseException as error:
+            # ошибку получат все ожидающие, повторная загрузка пойдет новым запросом
+            for key in keys:
+                future = self.cache.pop(key)
+                if future.done():
+                    continue
+                if isinstance(error, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(error)
+            if not isinstance(error, Exception):
+                raise
+            # ошибка уже у ожидающих, а эту задачу никто не ждет: raise дал бы только
+            # "Task exception was never retrieved" в логе
+            return
+        found = {row.id: row for row in rows}
+        for key in keys:
+            future = self.cache[key]
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+class Loaders:
+    """
+    Загрузчики одного HTTP запроса, по одному на модель: loaders.load(UserModel, 5)
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.lock = asyncio.Lock()
+        self.by_model: dict[type, DataLoader] = {}
+
+    def __call__(self, model) -> DataLoader:
+        loader = self.by_model.get(model)
+        if loader is None:
+            loader = self.by_model[model] = DataLoader(self, model)
+        return loader
+
+    async def load(self, model, key: int):
+        return await self(model).load(key)
+
+    async def load_many(self, model, keys) -> list:
+        return await self(model).load_many(keys)
@@ -1,6 +1,8 @@
 from collections.abc import AsyncGenerator
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import async_session_maker, SyncSessionLocal
+from app.dataloader import Loaders
 
 async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -15,4 +17,11 @@ def get_sync_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_loaders(db: AsyncSession = Depends(get_async_db)) -> Loaders:
+    """
+    DataLoader'ы на время запроса, с той же сессией, что и у ручки
+    """
+    return Loaders(db)
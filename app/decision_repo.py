@@ -0,0 +1,217 @@
+from functools import lru_cache
+
+from sqlalchemy import select, func, or_, any_, bindparam, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session, defer, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import DecisionModel, DecisionVoteModel, DecisionHistoryModel
+from app.serialization import deferred_columns
+
+
+# Запросы решений с голосами собираются один раз при импорте (или один раз на форму запроса),
+# значения уходят через bindparam. Собранный statement помнит свой ключ кеша,
+# поэтому на запрос не тратится ни сборка, ни его вычисление, а SQL берется из кеша компиляции
+
+LIKE = (
+    func.count(DecisionVoteModel.user_id)
+    .filter(DecisionVoteModel.is_like.is_(True))
+    .label("like")
+)
+DISLIKE = (
+    func.count(DecisionVoteModel.user_id)
+    .filter(DecisionVoteModel.is_like.is_(False))
+    .label("dislike")
+)
+# у пользователя не больше одного голоса за решение
+MY_VOTE = (
+    func.bool_or(DecisionVoteModel.is_like)
+    .filter(DecisionVoteModel.user_id == bindparam("user_id", type_=Integer))
+    .label("my_vote")
+)
+
+
+def with_votes(*columns):
+    """
+    select(решение, лайки, дизлайки, *columns) с голосами через outer join
+    """
+    return (
+        select(DecisionModel, LIKE, DISLIKE, *columns)
+        .outerjoin(DecisionModel.votes)
+        .group_by(DecisionModel.id)
+    )
+
+
+BY_ID = with_votes().where(
+    DecisionModel.id == bindparam("decision_id", type_=Integer),
+    DecisionModel.is_active.is_(True),
+)
+# для get_decision из decision_history: вместе с активными историями
+BY_ID_WITH_HISTORY = BY_ID.options(
+    selectinload(DecisionModel.decision_history.and_(DecisionHistoryModel.is_active == True))
+)
+# только счетчики, без строки решения: для подписки на голоса
+COUNTS_BY_ID = (
+    select(DecisionModel.id, LIKE, DISLIKE)
+    .outerjoin(DecisionModel.votes)
+    .where(
+        DecisionModel.id == bindparam("decision_id", type_=Integer),
+        DecisionModel.is_active.is_(True),
+    )
+    .group_by(DecisionModel.id)
+)
+IDS = DecisionModel.id == any_(bindparam("ids", type_=ARRAY(Integer)))
+# счетчики нескольких решений прямо по голосам: для рассылки подписчикам, решений без голосов в ответе нет
+COUNTS_BY_IDS = (
+    select(DecisionVoteModel.decision_id, LIKE, DISLIKE)
+    .where(DecisionVoteModel.decision_id == any_(bindparam("ids", type_=ARRAY(Integer))))
+    .group_by(DecisionVoteModel.decision_id)
+)
+BY_IDS = with_votes().where(IDS, DecisionModel.is_active.is_(True))
+BY_IDS_WITH_MY_VOTE = with_votes(MY_VOTE).where(IDS, DecisionModel.is_active.is_(True))
+
+
+@lru_cache(maxsize=None)
+def search_stmt(has_search: bool, has_status: bool, deferred: tuple[str, ...]):
+    """
+    Страница поиска для одной формы запроса: есть ли текст поиска, статус и какие колонки отложены.
+    Форм немного, каждая собирается один раз
+    """
+    filters = [DecisionModel.is_active.is_(True)]
+    if has_status:
+        filters.append(DecisionModel.status == bindparam("status", type_=String))
+    order = DecisionModel.created_at.desc()
+
+    if has_search:
+        search_value = bindparam("search", type_=String)
+        ts_query_ru = func.websearch_to_tsquery("russian", search_value)
+        ts_query_en = func.websearch_to_tsquery("english", search_value)
+
+        fst_search = or_(
+            DecisionModel.tsv.op("@@")(ts_query_ru),
+            DecisionModel.tsv.op("@@")(ts_query_en),
+        )
+
+        trigram_search = or_(
+            DecisionModel.title.op("%")(search_value),
+            func.similarity(DecisionModel.title, search_value) > 0.15,
+        )
+
+        filters.append(or_(fst_search, trigram_search))
+
+        order = func.greatest(
+            func.ts_rank_cd(DecisionModel.tsv, ts_query_ru),
+            func.ts_rank_cd(DecisionModel.tsv, ts_query_en),
+            func.similarity(DecisionModel.title, search_value) * 0.5,
+        ).desc()
+
+    return (
+        with_votes()
+        .where(*filters)
+        .options(*(defer(getattr(DecisionModel, column)) for column in deferred))
+        .order_by(order)
+        .limit(bindparam("limit", type_=Integer))
+        .offset(bindparam("offset", type_=Integer))
+    )
+
+
+@lru_cache(maxsize=None)
+def user_decisions_stmt(has_cursor: bool, deferred: tuple[str, ...]):
+    """
+    Решения пользователя в одном статусе, по возрастанию даты, после last_id если он есть
+    """
+    filters = [
+        DecisionModel.is_active == True,
+        DecisionModel.user_id == bindparam("user_id", type_=Integer),
+        DecisionModel.status == bindparam("status", type_=String),
+    ]
+    if has_cursor:
+        filters.append(DecisionModel.id > bindparam("last_id", type_=Integer))
+    return (
+        with_votes()
+        .where(*filters)
+        .options(*(defer(getattr(DecisionModel, column)) for column in deferred))
+        .order_by(DecisionModel.created_at.asc())
+        .limit(bindparam("limit", type_=Integer))
+    )
+
+
+async def decision_with_votes(db: AsyncSession, decision_id: int):
+    """
+    (решение, лайки, дизлайки) активного решения или None
+    """
+    return (await db.execute(BY_ID, {"decision_id": decision_id})).first()
+
+
+def decision_with_votes_sync(db: Session, decision_id: int):
+    return db.execute(BY_ID, {"decision_id": decision_id}).first()
+
+
+async def decision_with_history(db: AsyncSession, decision_id: int):
+    return (await db.execute(BY_ID_WITH_HISTORY, {"decision_id": decision_id})).first()
+
+
+async def vote_counts(db: AsyncSession, decision_id: int):
+    """
+    (id, like, dislike) активного решения или None
+    """
+    return (await db.execute(COUNTS_BY_ID, {"decision_id": decision_id})).first()
+
+
+async def vote_counts_many(db: AsyncSession, ids) -> dict[int, tuple[int, int]]:
+    """
+    {id: (лайки, дизлайки)} решений из ids, у которых есть голоса
+    """
+    result = await db.execute(COUNTS_BY_IDS, {"ids": list(set(ids))})
+    return {decision_id: (like, dislike) for decision_id, like, dislike in result.all()}
+
+
+async def decisions_with_votes(db: AsyncSession, ids) -> dict[int, tuple]:
+    """
+    Активные решения из ids с голосами: {id: (решение, лайки, дизлайки)}, порядок ids не сохраняется
+    """
+    result = await db.execute(BY_IDS, {"ids": list(set(ids))})
+    return {decision.id: (decision, like, dislike) for decision, like, dislike in result.all()}
+
+
+async def decisions_with_my_vote(db: AsyncSession, ids, user_id: int) -> list[tuple]:
+    """
+    [(решение, лайки, дизлайки, голос user_id)] для активных решений из ids
+    """
+    result = await db.execute(BY_IDS_WITH_MY_VOTE, {"ids": list(set(ids)), "user_id": user_id})
+    return result.all()
+
+
+async def search_decisions(
+    db: AsyncSession,
+    *,
+    search: str | None,
+    status: str | None,
+    page: int,
+    page_size: int,
+    fields: frozenset[str] | None = None,
+) -> list[tuple]:
+    search_value = search.strip() if search else ""
+    params = {"limit": page_size, "offset": (page - 1) * page_size}
+    if search_value:
+        params["search"] = search_value
+    if status:
+        params["status"] = status
+    stmt = search_stmt(bool(search_value), bool(status), tuple(deferred_columns(fields)))
+    return (await db.execute(stmt, params)).all()
+
+
+async def user_decisions(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    status: str,
+    last_id: int | None,
+    limit: int,
+    fields: frozenset[str] | None = None,
+) -> list[tuple]:
+    params = {"user_id": user_id, "status": status, "limit": limit}
+    if last_id is not None:
+        params["last_id"] = last_id
+    stmt = user_decisions_stmt(last_id is not None, tuple(deferred_columns(fields)))
+    return (await db.execute(stmt, params)).all()
@@ -0,0 +1,152 @@
+import argparse
+
+from celery import shared_task
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, DateTime, DDL, event, text, select, func
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.database import Base, SyncSessionLocal, sync_engine
+
+
+# Представление не входит в Base.metadata, иначе create_all сделает из него таблицу
+view_metadata = MetaData()
+
+decision_stats = Table(
+    "decision_stats",
+    view_metadata,
+    Column("decision_id", Integer, primary_key=True),
+    Column("user_id", Integer),
+    Column("status", String(20)),
+    Column("created_at", DateTime(timezone=True)),
+    Column("likes", Integer),
+    Column("dislikes", Integer),
+    Column("comments", Integer),
+    Column("history_count", Integer),
+)
+
+# Время последнего пересчета - одна строка в обычной таблице. Колонка now() в представлении
+# меняла бы каждую строку, и REFRESH ... CONCURRENTLY переписывал бы все представление и индексы
+decision_stats_refresh = Table(
+    "decision_stats_refresh",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("refreshed_at", DateTime(timezone=True), nullable=False),
+)
+REFRESH_ROW_ID = 1
+
+SORT_COLUMNS = ("likes", "dislikes", "comments", "history_count")
+# любое число, одинаковое у всех воркеров: два обновления одновременно не запускаем
+REFRESH_LOCK_KEY = 370001
+
+CREATE_DECISION_STATS = [
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS decision_stats AS
+    SELECT
+        d.id AS decision_id,
+        d.user_id,
+        d.status,
+        d.created_at,
+        coalesce(v.likes, 0)::int AS likes,
+        coalesce(v.dislikes, 0)::int AS dislikes,
+        coalesce(c.comments, 0)::int AS comments,
+        coalesce(h.history_count, 0)::int AS history_count
+    FROM decisions d
+    LEFT JOIN (
+        SELECT decision_id,
+               count(*) FILTER (WHERE is_like) AS likes,
+               count(*) FILTER (WHERE NOT is_like) AS dislikes
+        FROM decision_votes
+        GROUP BY decision_id
+    ) v ON v.decision_id = d.id
+    LEFT JOIN (
+        SELECT decision_id, count(*) AS comments
+        FROM comments
+        WHERE status
+        GROUP BY decision_id
+    ) c ON c.decision_id = d.id
+    LEFT JOIN (
+        SELECT decision_id, count(*) AS history_count
+        FROM decision_history
+        WHERE is_active
+        GROUP BY decision_id
+    ) h ON h.decision_id = d.id
+    WHERE d.is_active
+    WITH DATA
+    """,
+    # без уникального индекса REFRESH ... CONCURRENTLY не работает
+    "CREATE UNIQUE INDEX IF NOT EXISTS decision_stats_decision_id ON decision_stats (decision_id)",
+    "CREATE INDEX IF NOT EXISTS decision_stats_user_id ON decision_stats (user_id)",
+    *(
+        f"CREATE INDEX IF NOT EXISTS decision_stats_{column} ON decision_stats ({column} DESC, decision_id DESC)"
+        for column in SORT_COLUMNS
+    ),
+]
+
+for statement in CREATE_DECISION_STATS:
+    event.listen(Base.metadata, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+def create_decision_stats(recreate: bool = False) -> None:
+    with sync_engine.begin() as connection:
+        decision_stats_refresh.create(connection, checkfirst=True)
+        if recreate:
+            connection.execute(text("DROP MATERIALIZED VIEW IF EXISTS decision_stats"))
+        for statement in CREATE_DECISION_STATS:
+            connection.execute(text(statement))
+
+
+def mark_refreshed(db) -> None:
+    stmt = pg_insert(decision_stats_refresh).values(id=REFRESH_ROW_ID, refreshed_at=func.now())
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[decision_stats_refresh.c.id],
+        set_={"refreshed_at": stmt.excluded.refreshed_at},
+    ))
+
+
+def refreshed_at():
+    """
+    Время последнего пересчета подзапросом, для select рядом с колонками представления
+    """
+    return (
+        select(decision_stats_refresh.c.refreshed_at)
+        .where(decision_stats_refresh.c.id == REFRESH_ROW_ID)
+        .scalar_subquery()
+        .label("refreshed_at")
+    )
+
+
+def refresh_stats() -> bool:
+    """
+    REFRESH MATERIALIZED VIEW CONCURRENTLY: читатели не блокируются на время пересчета.
+    False если обновление уже идет в другом воркере
+    """
+    db = SyncSessionLocal()
+    try:
+        if not db.scalar(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": REFRESH_LOCK_KEY}):
+            return False
+        db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY decision_stats"))
+        mark_refreshed(db)
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+@shared_task
+def refresh_decision_stats():
+    return refresh_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Материализованное представление decision_stats")
+    parser.add_argument("--create", action="store_true", help="создать представление и индексы, если их нет")
+    parser.add_argument("--recreate", action="store_true", help="пересоздать представление (после смены его колонок)")
+    args = parser.parse_args()
+    if args.create or args.recreate:
+        create_decision_stats(recreate=args.recreate)
+    print("Обновлено" if refresh_stats() else "Обновление уже идет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from fastapi import Request, Response, status
+from sqlalchemy import update, select
+
+from app.models import DecisionModel
+
+
+# ответы с решением зависят от пользователя: кеш только в клиенте и с проверкой ETag
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+# снимок истории не меняется после создания, но его могут скрыть или удалить:
+# без запроса отдаем из кеша недолго, дальше клиент проверяет ETag
+HISTORY_CACHE_CONTROL = "private, max-age=300"
+
+
+def bump_version(decision_ids):
+    """
+    UPDATE decisions.version + 1 для записей, которые меняют ответ без смены updated_at:
+    голоса, комментарии, истории. decision_ids - список или select
+    """
+    return (
+        update(DecisionModel)
+        .where(DecisionModel.id.in_(decision_ids))
+        .values(version=DecisionModel.version + 1, updated_at=DecisionModel.updated_at)
+    )
+
+
+def decision_state(decision_id: int, active_only: bool = True):
+    """
+    Дешевый запрос (updated_at, version) решения для ETag, до тяжелой агрегации
+    """
+    stmt = select(DecisionModel.updated_at, DecisionModel.version).where(DecisionModel.id == decision_id)
+    if active_only:
+        stmt = stmt.where(DecisionModel.is_active.is_(True))
+    return stmt
+
+
+def make_etag(*parts) -> str:
+    return 'W/"' + "-".join(
+        f"{part.timestamp():.6f}" if hasattr(part, "timestamp") else str(part)
+        for part in parts
+    ) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    If-None-Match со слабым сравнением: W/ у тегов не учитывается
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag, cache_control))
+
+
+def etag_headers(etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def set_etag(response: Response, etag: str, cache_control: str = REVALIDATE_CACHE_CONTROL) -> None:
+    response.headers.update(etag_headers(etag, cache_control))
@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+from celery import shared_task
+from PIL import Image, ImageOps
+from sqlalchemy import update
+
+from app.database import SyncSessionLocal
+from app.media import MEDIA_ROOT, MEDIA_URL, media_path, variants_dir
+from app.models import DecisionModel
+
+
+# имя варианта -> максимальная ширина в пикселях
+VARIANT_WIDTHS = {
+    "thumb": 160,
+    "card": 640,
+    "full": 1600,
+}
+VARIANT_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+
+
+def _save_atomic(image: Image.Image, path, options: dict) -> None:
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".part", delete=False) as tmp:
+        try:
+            image.save(tmp, **options)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    # JPEG не умеет прозрачность, кладем на белый фон
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def build_variants(image_url: str) -> dict:
+    """
+    Генерирует уменьшенные копии картинки в WebP и JPEG без метаданных.
+    Возвращает описание вариантов для DecisionModel.image_variants
+    """
+    source = media_path(image_url)
+    target_dir = variants_dir(image_url)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    base_url = f"{MEDIA_URL}/{target_dir.relative_to(MEDIA_ROOT).as_posix()}"
+
+    with Image.open(source) as original:
+        original.load()
+        has_alpha = original.mode in ("RGBA", "LA") or "transparency" in original.info
+        pixels = ImageOps.exif_transpose(original)
+
+    variants = {"source": image_url}
+    for name, max_width in VARIANT_WIDTHS.items():
+        image = pixels
+        if image.width > max_width:
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.Resampling.LANCZOS)
+        webp = image.convert("RGBA" if has_alpha else "RGB")
+        jpeg = _flatten(image)
+        urls = {"width": image.width}
+        for fmt, converted in (("webp", webp), ("jpeg", jpeg)):
+            converted.info = {} #EXIF, GPS, ICC и прочие метаданные не сохраняем
+            filename = f"{name}.{'jpg' if fmt == 'jpeg' else fmt}"
+            _save_atomic(converted, target_dir / filename, VARIANT_FORMATS[fmt])
+            urls[fmt] = f"{base_url}/{filename}"
+        variants[name] = urls
+    return variants
+
+
+@shared_task
+def generate_image_variants(decision_id: int, image_url: str):
+    if media_path(image_url) is None:
+        return False #варианты строим только для локального хранилища
+    variants = build_variants(image_url)
+    db = SyncSessionLocal()
+    try:
+        # картинку могли заменить пока задача работала, тогда варианты уже не нужны
+        result = db.execute(
+            update(DecisionModel)
+            .where(DecisionModel.id == decision_id, DecisionModel.image_url == image_url)
+            .values(image_variants=variants, version=DecisionModel.version + 1, updated_at=DecisionModel.updated_at)
+        )
+        db.commit()
+        return result.rowcount > 0
+    finally:
+        db.close()
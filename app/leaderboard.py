@@ -0,0 +1,105 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from celery import shared_task
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SyncSessionLocal
+from app.models import UserModel, UserDecisionDayModel, LeaderboardEntryModel
+from app.schemas.users import LeaderboardSchema, LeaderboardEntrySchema
+
+
+LEADERBOARD_SIZE = 100
+# окно -> дней, None - за все время
+WINDOWS = {"7d": 7, "30d": 30, "all": None}
+CACHE_SECONDS = 60
+
+_cache: dict[str, tuple[float, LeaderboardSchema]] = {}
+
+
+def record_accepted(db, user_id: int) -> None:
+    """
+    +1 в дневную корзину пользователя, вызывать в транзакции перевода решения в ready
+    """
+    today = datetime.now(timezone.utc).date()
+    stmt = pg_insert(UserDecisionDayModel).values(user_id=user_id, day=today, accepted=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserDecisionDayModel.user_id, UserDecisionDayModel.day],
+        set_={"accepted": UserDecisionDayModel.accepted + 1},
+    ))
+
+
+def _top(window: str, today):
+    days = WINDOWS[window]
+    if days is None:
+        # за все время - счетчик из users, по индексу users_active_decisions_taken
+        return (
+            select(UserModel.id, UserModel.name, UserModel.decisions_taken.label("accepted"))
+            .where(UserModel.is_active.is_(True), UserModel.decisions_taken > 0)
+            .order_by(UserModel.decisions_taken.desc(), UserModel.id)
+            .limit(LEADERBOARD_SIZE)
+        )
+    accepted = func.sum(UserDecisionDayModel.accepted).label("accepted")
+    return (
+        select(UserModel.id, UserModel.name, accepted)
+        .join(UserModel, UserModel.id == UserDecisionDayModel.user_id)
+        .where(UserDecisionDayModel.day > today - timedelta(days=days), UserModel.is_active.is_(True))
+        .group_by(UserModel.id)
+        .order_by(accepted.desc(), UserModel.id)
+        .limit(LEADERBOARD_SIZE)
+    )
+
+
+def snapshot() -> dict:
+    """
+    Пересчитывает топ по каждому окну и заменяет снимок в одной транзакции.
+    Корзины старше самого длинного окна удаляются
+    """
+    today = datetime.now(timezone.utc).date()
+    report = {}
+    db = SyncSessionLocal()
+    try:
+        for window in WINDOWS:
+            rows = db.execute(_top(window, today)).all()
+            db.execute(delete(LeaderboardEntryModel).where(LeaderboardEntryModel.window == window))
+            if rows:
+                db.execute(insert(LeaderboardEntryModel), [
+                    {"window": window, "rank": rank, "user_id": user_id, "name": name, "accepted": accepted}
+                    for rank, (user_id, name, accepted) in enumerate(rows, start=1)
+                ])
+            report[window] = len(rows)
+        longest = max(days for days in WINDOWS.values() if days is not None)
+        db.execute(delete(UserDecisionDayModel).where(UserDecisionDayModel.day <= today - timedelta(days=longest)))
+        db.commit()
+    finally:
+        db.close()
+    return report
+
+
+@shared_task
+def snapshot_leaderboard():
+    return snapshot()
+
+
+async def get_leaderboard(db: AsyncSession, window: str) -> LeaderboardSchema:
+    """
+    Снимок окна из таблицы, в процессе кешируется на CACHE_SECONDS
+    """
+    cached = _cache.get(window)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    result = await db.scalars(
+        select(LeaderboardEntryModel)
+        .where(LeaderboardEntryModel.window == window)
+        .order_by(LeaderboardEntryModel.rank)
+    )
+    entries = result.all()
+    board = LeaderboardSchema(
+        window=window,
+        computed_at=entries[0].computed_at if entries else None,
+        items=[LeaderboardEntrySchema.model_validate(entry) for entry in entries],
+    )
+    _cache[window] = (time.monotonic() + CACHE_SECONDS, board)
+    return board
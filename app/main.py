@@ -1,14 +1,21 @@
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
 from contextlib import asynccontextmanager
 
 from app.celery_app import celery_app
+from app.config import vote_broadcaster, MEDIA_ACCEL_REDIRECT
+from app.media import MediaStaticFiles
+from app.storage import storage
+from app.trending import trending, rebuild_trending
+from app.database import async_session_maker
+from app.compression import CompressionMiddleware
 
 from app.routers import users
 from app.routers import decisions
 from app.routers import decision_history
 from app.routers import comments
+from app.routers import archive
+from app.routers import stats
 
 
 
@@ -22,9 +29,15 @@ async def lifespan(app: FastAPI):
         print("✅ Связь с Redis для Celery установлена!")
     except Exception as e:
         print(f"❌ Ошибка подключения к Redis: {e}")
+    await vote_broadcaster.start() #рассылка счетчиков голосов подписчикам
+    async with async_session_maker() as db:
+        await rebuild_trending(db) #индекс пуст после очистки Redis или в памяти нового процесса
 
     yield  # --- ПАУЗА: В этот момент FastAPI работает и ждет юзеров --- 
     print("🛑 Приложение останавливается...")
+    await vote_broadcaster.stop()
+    await storage.close()
+    await trending.close()
 
 
 
@@ -34,13 +47,17 @@ app = FastAPI(
     version="0.0.1",
     lifespan=lifespan
 )
+
+app.add_middleware(CompressionMiddleware) #gzip/br/zstd для JSON ответов, см. app.compression
  
-app.mount("/media",StaticFiles(directory="media"), name="media")
+app.mount("/media",MediaStaticFiles(directory="media", accel_redirect=MEDIA_ACCEL_REDIRECT), name="media")
 
 app.include_router(users.router)
 app.include_router(decisions.router)
 app.include_router(decision_history.router)
 app.include_router(comments.router)
+app.include_router(archive.router)
+app.include_router(stats.router)
 
 
 @app.get("/")
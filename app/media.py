@@ -0,0 +1,256 @@
+import os
+import re
+import time
+import asyncio
+import base64
+import shutil
+import hashlib
+import tempfile
+import logging
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+from sqlalchemy import select, func, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import DecisionModel, DecisionHistoryModel, DecisionArchiveModel, DecisionHistoryArchiveModel
+from app.storage import MEDIA_ROOT, MEDIA_URL, LocalStorage, storage
+
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_ROOT = MEDIA_ROOT / "variants"
+MAX_SIZE = 2 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# свежие файлы не удаляем: на них может ссылаться еще не закоммиченная запись
+RELEASE_GRACE_SECONDS = 10 * 60
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MEDIA_CACHE_CONTROL = "public, max-age=86400"
+
+# сигнатуры файлов -> расширение, content_type от клиента не проверяем
+IMAGE_SIGNATURES = {
+    b"\x89PNG\r\n\x1a\n": ".png",
+    b"\xff\xd8\xff": ".jpg",
+}
+CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg"}
+SIGNATURE_SIZE = max(len(signature) for signature in IMAGE_SIGNATURES)
+# ab/cd/<sha256>.ext относительно MEDIA_ROOT
+CONTENT_ADDRESSED_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z]+$")
+
+
+def content_key(digest: str, extension: str) -> str:
+    """
+    Путь файла относительно MEDIA_ROOT: шардируем по первым байтам хеша,
+    чтобы в одной папке не лежали миллионы файлов
+    """
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def media_path(image_url: str) -> Path | None:
+    """
+    Переводит image_url в путь на диске, None если url не из локального MEDIA_ROOT
+    """
+    if not isinstance(storage, LocalStorage):
+        return None
+    key = storage.key_for_url(image_url)
+    return None if key is None else storage.path(key)
+
+
+def variants_dir(image_url: str) -> Path:
+    stem = Path(image_url).stem
+    if CONTENT_ADDRESSED_RE.match(image_url[len(MEDIA_URL) + 1:]):
+        return VARIANTS_ROOT / stem[:2] / stem[2:4] / stem
+    return VARIANTS_ROOT / stem
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """
+    Определяет формат картинки по первым байтам, None если формат не поддерживается
+    """
+    for signature, extension in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def _open_temp():
+    return tempfile.NamedTemporaryFile(dir=storage.staging_dir, suffix=".part", delete=False)
+
+
+def _discard(tmp) -> None:
+    tmp.close()
+    Path(tmp.name).unlink(missing_ok=True)
+
+
+async def save_image(file: UploadFile) -> str:
+    """
+    Сохраняет картинку потоково: читает кусками, обрывает загрузку при превышении MAX_SIZE,
+    пишет во временный файл в пуле потоков и отдает его хранилищу.
+    Имя файла - sha256 содержимого, одинаковые картинки хранятся один раз
+    """
+    if file.size is not None and file.size > MAX_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл слишком большой")
+    tmp = await run_in_threadpool(_open_temp)
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    try:
+        while chunk := await file.read(CHUNK_SIZE):
+            if extension is None:
+                extension = sniff_image_type(chunk)
+                if extension is None:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неподходящий формат файла")
+            size += len(chunk)
+            if size > MAX_SIZE:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл слишком большой")
+            digest.update(chunk)
+            await run_in_threadpool(tmp.write, chunk)
+        if extension is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Пустой файл")
+        key = content_key(digest.hexdigest(), extension)
+        await run_in_threadpool(tmp.close)
+        await storage.put_file(key, tmp.name, CONTENT_TYPES[extension])
+    except BaseException:
+        await run_in_threadpool(_discard, tmp)
+        raise
+    return storage.url_for_key(key)
+
+
+async def presign_image_upload(digest: str, size: int, content_type: str) -> dict:
+    """
+    Ключ и подписанный запрос для загрузки картинки напрямую в хранилище,
+    upload=None если такая картинка уже загружена
+    """
+    extension = next(ext for ext, value in CONTENT_TYPES.items() if value == content_type)
+    key = content_key(digest, extension)
+    if await storage.stat(key) is not None:
+        # решение сошлется на файл позже, до этого его не должно удалить освобождение старых копий
+        await storage.touch(key, content_type)
+        return {"image_key": key, "upload": None}
+    upload = await storage.presign_upload(
+        key, content_type, size, base64.b64encode(bytes.fromhex(digest)).decode()
+    )
+    if upload is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Прямая загрузка не поддерживается, отправьте файл формой")
+    return {"image_key": key, "upload": upload}
+
+
+async def resolve_uploaded_image(key: str) -> str:
+    """
+    Проверяет картинку, загруженную напрямую в хранилище, и возвращает ее url.
+    Формат проверяется по первым байтам, как в save_image
+    """
+    extension = os.path.splitext(key)[1]
+    if not CONTENT_ADDRESSED_RE.match(key) or extension not in CONTENT_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный ключ картинки")
+    stat = await storage.stat(key)
+    if stat is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Картинка не загружена")
+    if stat[0] > MAX_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл слишком большой")
+    head = await storage.read_head(key, SIGNATURE_SIZE)
+    if sniff_image_type(head) != extension:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неподходящий формат файла")
+    return storage.url_for_key(key)
+
+
+def _refcount_stmt(image_url: str):
+    references = union_all(*(
+        select(model.id).where(model.image_url == image_url)
+        for model in (DecisionModel, DecisionHistoryModel, DecisionArchiveModel, DecisionHistoryArchiveModel)
+    )).subquery()
+    return select(func.count()).select_from(references)
+
+
+async def image_refcount(db: AsyncSession, image_url: str) -> int:
+    """
+    Количество ссылок на файл из decisions, decision_history и их архивов
+    """
+    return await db.scalar(_refcount_stmt(image_url))
+
+
+async def _release(image_url: str) -> None:
+    key = storage.key_for_url(image_url)
+    if key is None:
+        return
+    stat = await storage.stat(key)
+    if stat is None or time.time() - stat[1] < RELEASE_GRACE_SECONDS:
+        return
+    await storage.delete(key)
+    if isinstance(storage, LocalStorage):
+        await run_in_threadpool(shutil.rmtree, variants_dir(image_url), True)
+
+
+async def release_images(db: AsyncSession, image_urls) -> None:
+    """
+    Удаляет файлы, на которые больше никто не ссылается. Вызывать после commit
+    """
+    for image_url in {url for url in image_urls if url}:
+        if await image_refcount(db, image_url) == 0:
+            await _release(image_url)
+
+
+def release_images_sync(db, image_urls) -> None:
+    """
+    release_images для задач Celery (синхронная сессия). Файлы удаляются в своем цикле событий,
+    клиент хранилища закрывается вместе с ним. Строки уже удалены, поэтому ошибка хранилища
+    задачу не валит: файл останется сиротой
+    """
+    unreferenced = [url for url in {url for url in image_urls if url} if db.scalar(_refcount_stmt(url)) == 0]
+    if not unreferenced:
+        return
+
+    async def release():
+        try:
+            for image_url in unreferenced:
+                await _release(image_url)
+        finally:
+            await storage.close()
+
+    try:
+        asyncio.run(release())
+    except Exception:
+        logger.exception("Не удалось освободить картинки %s", unreferenced)
+
+
+class MediaStaticFiles(StaticFiles):
+    """
+    Раздача картинок: сильный ETag и вечный кеш для файлов, адресованных по содержимому,
+    304 на If-None-Match/If-Modified-Since. Range и http.response.pathsend (zero-copy,
+    если сервер поддерживает) делает FileResponse. Если задан accel_redirect,
+    отдаем только заголовки с X-Accel-Redirect и файл отправляет nginx
+    """
+
+    def __init__(self, *args, accel_redirect: str | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accel_redirect = accel_redirect.rstrip("/") + "/" if accel_redirect else None
+        self.root = os.path.realpath(self.directory)
+
+    def cache_headers(self, full_path) -> dict[str, str]:
+        relative = os.path.relpath(full_path, MEDIA_ROOT).replace(os.sep, "/")
+        if CONTENT_ADDRESSED_RE.match(relative):
+            # имя файла и есть хеш содержимого - это сильный валидатор
+            return {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{Path(relative).stem}"'}
+        return {"Cache-Control": MEDIA_CACHE_CONTROL}
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        headers = self.cache_headers(full_path)
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        if self.accel_redirect is None:
+            return response
+        relative = os.path.relpath(full_path, self.root).replace(os.sep, "/")
+        headers.update({
+            "ETag": response.headers["etag"],
+            "Last-Modified": response.headers["last-modified"],
+            "X-Accel-Redirect": self.accel_redirect + relative,
+        })
+        return Response(status_code=status_code, headers=headers, media_type=response.media_type)
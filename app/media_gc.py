@@ -0,0 +1,153 @@
+import os
+import time
+import shutil
+import argparse
+from itertools import islice
+
+from celery import shared_task
+from sqlalchemy import select, union
+
+from app.database import SyncSessionLocal
+from app.media import MEDIA_ROOT, MEDIA_URL, VARIANTS_ROOT
+from app.storage import LocalStorage, storage
+from app.models import DecisionModel, DecisionHistoryModel, DecisionArchiveModel, DecisionHistoryArchiveModel
+
+
+GRACE_SECONDS = 24 * 60 * 60
+CHUNK_SIZE = 1000
+
+
+def _walk_files(root):
+    """
+    Обходит дерево без рекурсии и без списка всех файлов в памяти
+    """
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path != str(VARIANTS_ROOT):
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry.path, entry.stat(follow_symlinks=False)
+
+
+def _walk_variant_dirs():
+    if not VARIANTS_ROOT.exists():
+        return
+    stack = [str(VARIANTS_ROOT)]
+    while stack:
+        path = stack.pop()
+        with os.scandir(path) as entries:
+            subdirs = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+        # папка с вариантами одной картинки не содержит подпапок
+        if subdirs:
+            stack.extend(subdirs)
+        elif path != str(VARIANTS_ROOT):
+            yield path
+
+
+def _url(path: str) -> str:
+    return f"{MEDIA_URL}/{os.path.relpath(path, MEDIA_ROOT).replace(os.sep, '/')}"
+
+
+def _referenced(db, urls: list[str]) -> set[str]:
+    stmt = union(*(
+        select(model.image_url).where(model.image_url.in_(urls))
+        for model in (DecisionModel, DecisionHistoryModel, DecisionArchiveModel, DecisionHistoryArchiveModel)
+    ))
+    return set(db.scalars(stmt))
+
+
+def _prune_empty_dirs(path: str, stop) -> None:
+    while os.path.abspath(path) != os.path.abspath(stop):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
+
+def _original_exists(variant_dir: str) -> bool:
+    stem = os.path.basename(variant_dir)
+    relative = os.path.relpath(os.path.dirname(variant_dir), VARIANTS_ROOT)
+    original_dir = MEDIA_ROOT if relative == "." else MEDIA_ROOT / relative
+    try:
+        with os.scandir(original_dir) as entries:
+            return any(entry.name.startswith(stem + ".") for entry in entries)
+    except FileNotFoundError:
+        return False
+
+
+def collect_garbage(grace_seconds: int = GRACE_SECONDS, chunk_size: int = CHUNK_SIZE, dry_run: bool = False) -> dict:
+    """
+    Удаляет файлы из MEDIA_ROOT, на которые не ссылаются decisions, decision_history и их архивы
+    и которые старше grace_seconds, затем варианты удаленных картинок.
+    Файлы проверяются пачками по chunk_size, память не зависит от количества файлов
+    """
+    deadline = time.time() - grace_seconds
+    report = {"scanned": 0, "deleted": 0, "bytes_reclaimed": 0, "dry_run": dry_run}
+    if not isinstance(storage, LocalStorage):
+        return report #в S3 сиротами занимаются lifecycle-правила бакета
+    db = SyncSessionLocal()
+    try:
+        files = _walk_files(str(MEDIA_ROOT))
+        while batch := list(islice(files, chunk_size)):
+            report["scanned"] += len(batch)
+            old = [(path, stat) for path, stat in batch if stat.st_mtime < deadline]
+            if not old:
+                continue
+            # недокачанные .part файлы в базе никогда не бывают
+            urls = [_url(path) for path, _ in old if not path.endswith(".part")]
+            referenced = _referenced(db, urls) if urls else set()
+            db.rollback() #не держим транзакцию открытой между пачками
+            for path, stat in old:
+                if _url(path) in referenced:
+                    continue
+                report["deleted"] += 1
+                report["bytes_reclaimed"] += stat.st_size
+                if not dry_run:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        continue
+                    _prune_empty_dirs(os.path.dirname(path), MEDIA_ROOT)
+    finally:
+        db.close()
+
+    for variant_dir in _walk_variant_dirs():
+        if _original_exists(variant_dir):
+            continue
+        with os.scandir(variant_dir) as entries:
+            stats = [entry.stat(follow_symlinks=False) for entry in entries if entry.is_file(follow_symlinks=False)]
+        if any(stat.st_mtime >= deadline for stat in stats):
+            continue
+        report["deleted"] += len(stats)
+        report["bytes_reclaimed"] += sum(stat.st_size for stat in stats)
+        if not dry_run:
+            shutil.rmtree(variant_dir, ignore_errors=True)
+            _prune_empty_dirs(os.path.dirname(variant_dir), VARIANTS_ROOT)
+    return report
+
+
+@shared_task
+def collect_media_garbage():
+    return collect_garbage()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Удаление картинок решений, на которые никто не ссылается")
+    parser.add_argument("--grace-hours", type=float, default=GRACE_SECONDS / 3600, help="не трогать файлы моложе N часов")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="файлов на один запрос к базе")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать, ничего не удалять")
+    args = parser.parse_args()
+    report = collect_garbage(int(args.grace_hours * 3600), args.chunk_size, args.dry_run)
+    print(
+        f"Проверено файлов: {report['scanned']}, удалено: {report['deleted']}, "
+        f"освобождено: {report['bytes_reclaimed'] / 1024 / 1024:.2f} МБ"
+        + (" (dry run)" if args.dry_run else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,16 @@ from .decision_vote import DecisionVoteModel
 from .decision_history import DecisionHistoryModel
 from .comments import CommentModel
 from .comments_vote import CommentVoteModel
+from .user_jobs import UserJobModel
+from .archive import (
+    UserArchiveModel, DecisionArchiveModel, DecisionHistoryArchiveModel,
+    CommentArchiveModel, DecisionVoteArchiveModel, CommentVoteArchiveModel
+)
+from .leaderboard import UserDecisionDayModel, LeaderboardEntryModel
+from .vote_hours import DecisionVoteHourModel
 
 
-__all__ = ["UserModel", "DecisionModel", "DecisionVoteModel", "DecisionHistoryModel", "CommentModel","CommentVoteModel" ]
\ No newline at end of file
+__all__ = ["UserModel", "DecisionModel", "DecisionVoteModel", "DecisionHistoryModel", "CommentModel","CommentVoteModel", "UserJobModel",
+           "UserArchiveModel", "DecisionArchiveModel", "DecisionHistoryArchiveModel",
+           "CommentArchiveModel", "DecisionVoteArchiveModel", "CommentVoteArchiveModel",
+           "UserDecisionDayModel", "LeaderboardEntryModel", "DecisionVoteHourModel" ]
\ No newline at end of file
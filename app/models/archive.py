@@ -0,0 +1,95 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Integer, String, Boolean, DateTime, Float, func, TEXT
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime
+from typing import Optional
+
+from app.database import Base
+
+
+# Копии горячих таблиц для давно скрытых строк. Без внешних ключей и без
+# GIN индексов: строки переносятся пачками и возвращаются при восстановлении.
+# Колонки совпадают по именам с горячими таблицами, плюс archived_at
+
+
+class UserArchiveModel(Base):
+    __tablename__ = "users_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(20), nullable=False)
+    email: Mapped[str] = mapped_column(String(50), nullable=False) #без unique: email мог занять новый пользователь
+    password: Mapped[str] = mapped_column(String(255), nullable=False)
+    role: Mapped[str] = mapped_column(String(15), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class DecisionArchiveModel(Base):
+    __tablename__ = "decisions_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(100), nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True)
+    image_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, index=True)
+    image_variants: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    net_votes: Mapped[int] = mapped_column(Integer, nullable=False)
+    hot_score: Mapped[float] = mapped_column(Float, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class DecisionHistoryArchiveModel(Base):
+    __tablename__ = "decision_history_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(100), nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True)
+    image_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, index=True)
+    decision_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class CommentArchiveModel(Base):
+    __tablename__ = "comments_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    text: Mapped[str] = mapped_column(TEXT, nullable=False)
+    decision_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    parent_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    status: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class DecisionVoteArchiveModel(Base):
+    __tablename__ = "decision_votes_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    decision_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    is_like: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class CommentVoteArchiveModel(Base):
+    __tablename__ = "comments_votes_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    comment_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    is_like: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
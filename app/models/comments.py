@@ -14,20 +14,22 @@ class CommentModel(Base):
     id : Mapped[int] = mapped_column(Integer, primary_key=True)
     text : Mapped[str] = mapped_column(TEXT,nullable=False)
     decision_id : Mapped[int] = mapped_column(Integer, ForeignKey("decisions.id",ondelete="CASCADE"), nullable=False)
-    user_id : Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    parent_id : Mapped[int | None] = mapped_column(ForeignKey("comments.id"), nullable=True)
+    user_id : Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    parent_id : Mapped[int | None] = mapped_column(ForeignKey("comments.id", ondelete="CASCADE"), nullable=True, index=True)
     created_at : Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at : Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     status : Mapped[bool] = mapped_column(default=True, nullable=False)
+    deleted_at : Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
-    children : Mapped[list["CommentModel"]] = relationship(back_populates="parent")  
+    children : Mapped[list["CommentModel"]] = relationship(back_populates="parent", passive_deletes=True)  
     parent : Mapped[Optional["CommentModel"]] = relationship(back_populates="children", remote_side="CommentModel.id")
 
     user: Mapped["UserModel"] = relationship(back_populates="comments")
     decision: Mapped["DecisionModel"] = relationship(back_populates="comments")
     comment_votes : Mapped[list["CommentVoteModel"]] =  relationship(
         back_populates="comment",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
 
  
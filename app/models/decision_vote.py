@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, Boolean, ForeignKey, UniqueConstraint
+from sqlalchemy import Integer, Boolean, DateTime, ForeignKey, UniqueConstraint, Index, func
+from datetime import datetime
 
 from app.database import Base
 
@@ -21,8 +22,13 @@ class DecisionVoteModel(Base):
 
     is_like: Mapped[bool] = mapped_column(Boolean, nullable=False)
 
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
     __table_args__ = (
         UniqueConstraint("user_id", "decision_id", name="uq_user_decision_vote"),
+        Index("decision_votes_decision_created", "decision_id", "created_at"),
     )
 
     # relationships
@@ -1,8 +1,8 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import (
-    Integer, String, Boolean, DateTime, ForeignKey, Index, func, TEXT
+    Integer, String, Boolean, DateTime, Float, ForeignKey, Index, func, TEXT
 )
-from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.dialects.postgresql import TSVECTOR, JSONB
 from sqlalchemy.schema import Computed
 from datetime import datetime
 from typing import Optional
@@ -17,11 +17,13 @@ class DecisionModel(Base):
 
     title: Mapped[str] = mapped_column(String(100),  nullable=False)
     description: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True)
-    image_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    image_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, index=True)
+    image_variants: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True) #уменьшенные копии, заполняет celery
 
     user_id: Mapped[int] = mapped_column(
         ForeignKey("users.id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     created_at: Mapped[datetime] = mapped_column(
@@ -38,6 +40,11 @@ class DecisionModel(Base):
     is_active: Mapped[bool] = mapped_column(
         Boolean, default=True, nullable=False
     )
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True) #когда скрыто, для архивации
+
+    net_votes: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False) #лайки - дизлайки
+    hot_score: Mapped[float] = mapped_column(Float, default=0.0, server_default="0", nullable=False) #см. app.trending
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False) #растет при голосах и комментариях, см. app.etag
 
     tsv: Mapped[TSVECTOR] = mapped_column(
         TSVECTOR,
@@ -50,7 +57,8 @@ class DecisionModel(Base):
             """,
             persisted=True
         ),
-        nullable=False
+        nullable=False,
+        deferred=True, #нужен только в WHERE поиска, в Python не читаем
     )
 
     __table_args__ = (
@@ -61,6 +69,18 @@ class DecisionModel(Base):
             postgresql_using="gin",
             postgresql_ops={"title": "gin_trgm_ops"}
         ),
+        Index(
+            "decisions_active_hot_score",
+            hot_score.desc(),
+            postgresql_where=is_active.is_(True)
+        ),
+        # лента /decisions/unvoted: keyset по (created_at, id) среди открытых решений
+        Index(
+            "decisions_in_processing_created_at_id",
+            created_at.desc(),
+            id.desc(),
+            postgresql_where=(is_active.is_(True)) & (status == "in_processing")
+        ),
     )
 
     # relationships
@@ -69,16 +89,18 @@ class DecisionModel(Base):
     votes: Mapped[list["DecisionVoteModel"]] = relationship(
         back_populates="decision",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
     decision_history : Mapped[list["DecisionHistoryModel"]] = relationship(
         back_populates="decision",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     comments : Mapped[list["CommentModel"]] = relationship(
         back_populates="decision",
-        cascade="all, delete-orphan"
-
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
     
      
\ No newline at end of file
@@ -0,0 +1,30 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Integer, String, Date, DateTime, ForeignKey, Index, func
+from datetime import date, datetime
+
+from app.database import Base
+
+
+# сколько решений пользователя стали ready за день, для окон 7d/30d
+class UserDecisionDayModel(Base):
+    __tablename__ = "user_decision_days"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    accepted: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("user_decision_days_day", "day"),
+    )
+
+
+# снимок топа, пересчитывается периодической задачей
+class LeaderboardEntryModel(Base):
+    __tablename__ = "leaderboard_entries"
+
+    window: Mapped[str] = mapped_column(String(8), primary_key=True) #7d|30d|all
+    rank: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False) #без FK: снимок, пользователь мог исчезнуть
+    name: Mapped[str] = mapped_column(String(20), nullable=False)
+    accepted: Mapped[int] = mapped_column(Integer, nullable=False)
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,31 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Integer, String, DateTime, TEXT, func
+from datetime import datetime
+from typing import Optional
+
+from app.database import Base
+
+
+class UserJobModel(Base):
+    __tablename__ = "user_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # без внешнего ключа: статус задачи должен пережить удаление пользователя
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    kind: Mapped[str] = mapped_column(String(20), default="deactivation", nullable=False) #deactivation|purge
+    status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False) #pending|running|done|failed
+    stage: Mapped[str] = mapped_column(String(30), default="decisions", nullable=False) #с какого этапа продолжать
+    batch_size: Mapped[int] = mapped_column(Integer, default=500, nullable=False)
+
+    decisions_done: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    votes_done: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    history_done: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    comments_done: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    error: Mapped[Optional[str]] = mapped_column(TEXT, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
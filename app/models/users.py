@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Boolean, DateTime, func
+from sqlalchemy import Integer, String, Boolean, DateTime, Index, func
 from datetime import datetime
+from typing import Optional
 
 from app.database import Base
 
@@ -23,24 +24,40 @@ class UserModel(Base):
     )
 
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # счетчики активных решений, меняются вместе с решениями в той же транзакции
+    decisions_taken: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    unaccepted_decisions: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
+    __table_args__ = (
+        # keyset пагинация списка пользователей: (created_at, id) DESC
+        Index("users_active_created_at_id", "created_at", "id", postgresql_where=is_active.is_(True)),
+        # лидерборд за все время
+        Index("users_active_decisions_taken", decisions_taken.desc(), postgresql_where=is_active.is_(True)),
+    )
 
     # relationships
     decisions: Mapped[list["DecisionModel"]] = relationship(
         back_populates="user",
-        cascade="all, delete-orphan"     
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
 
     votes: Mapped[list["DecisionVoteModel"]] = relationship(
         back_populates="user",
-        cascade="all, delete-orphan"     
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
     comments : Mapped[list["CommentModel"]] = relationship(
         back_populates="user",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
     comment_votes : Mapped[list["CommentVoteModel"]] =  relationship(
         back_populates="user",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
 
 
@@ -0,0 +1,15 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import Integer, DateTime, ForeignKey
+from datetime import datetime
+
+from app.database import Base
+
+
+# голоса решения по часам, в которые они поставлены: сумма по часам = текущие лайки/дизлайки
+class DecisionVoteHourModel(Base):
+    __tablename__ = "decision_vote_hours"
+
+    decision_id: Mapped[int] = mapped_column(ForeignKey("decisions.id", ondelete="CASCADE"), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    likes: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    dislikes: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import UserModel, UserArchiveModel, DecisionArchiveModel
+from app.db_depends import get_async_db
+from app.config import jwt_manager
+from app.archive import restore_decision, restore_user, user_role, rescored_scores
+from app.trending import update_score
+
+
+router = APIRouter(
+    prefix="/archive",
+    tags=["Archive"]
+)
+
+
+def check_can_restore(current_user: UserModel, target_role: str | None) -> None:
+    # те же правила, что и для удаления
+    if current_user.role == "user":
+        raise HTTPException(403, "Юзеры ничего не восстанавливают!")
+    if current_user.role == "admin" and target_role in ("admin", "super_admin"):
+        raise HTTPException(403, "Админы восстанавливают только юзеров!")
+
+
+@router.post("/decisions/{decision_id}/restore")
+async def restore_archived_decision(
+    decision_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(jwt_manager.get_current_user)
+):
+    user_id = await db.scalar(select(DecisionArchiveModel.user_id).where(DecisionArchiveModel.id == decision_id))
+    if user_id is None:
+        raise HTTPException(404, "Решение не найдено в архиве")
+    check_can_restore(current_user, await db.run_sync(user_role, user_id))
+    try:
+        await db.run_sync(restore_decision, decision_id)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        rescored_scores(db)
+        raise HTTPException(409, "Восстановление конфликтует с существующими данными")
+    for rescored_id, score in rescored_scores(db).items():
+        await update_score(rescored_id, score)
+    return {"status": "restored", "message": "Решение возвращено из архива", "decision_id": decision_id}
+
+
+@router.post("/users/{user_id}/restore")
+async def restore_archived_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(jwt_manager.get_current_user)
+):
+    target_role = await db.scalar(select(UserArchiveModel.role).where(UserArchiveModel.id == user_id))
+    if target_role is None:
+        raise HTTPException(404, "Пользователь не найден в архиве")
+    check_can_restore(current_user, target_role)
+    try:
+        await db.run_sync(restore_user, user_id)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        rescored_scores(db)
+        raise HTTPException(409, "Email пользователя уже занят или данные конфликтуют")
+    for rescored_id, score in rescored_scores(db).items():
+        await update_score(rescored_id, score)
+    return {"status": "restored", "message": "Пользователь возвращен из архива", "user_id": user_id}
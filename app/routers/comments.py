@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 
 from sqlalchemy import select, func, update, delete
-from sqlalchemy.orm import selectinload, outerjoin, joinedload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import CommentModel, CommentVoteModel, UserModel, DecisionModel
+from app.models import CommentModel, CommentVoteModel, UserModel, DecisionModel, CommentArchiveModel
 from app.schemas.comments import CommentCreateSchema, CommentSchema, CommentUpdateSchema
-from app.db_depends import get_async_db
+from app.db_depends import get_async_db, get_loaders
+from app.dataloader import Loaders
 from app.config import jwt_manager
-from app.utilits import like_comment, dislike_comment
+from app.utilits import like_comment, dislike_comment, my_comment_votes
+from app.archive import user_role, delete_archived_comments
+from app.etag import bump_version, decision_state, make_etag, etag_matches, not_modified, etag_headers
+from app.serialization import json_response, comment_item, COMMENT_LIST
+from app.single_flight import SingleFlight
+from app.database import async_session_maker
 
 
 router = APIRouter(
@@ -16,22 +21,22 @@ router = APIRouter(
     tags=["Comments"]
 )
 
+comment_page_flight = SingleFlight("comment_decision")
+
 
 @router.post("/", response_model=CommentSchema, status_code=status.HTTP_201_CREATED)
 async def create_comment(
     new_comment : CommentCreateSchema,
     db : AsyncSession = Depends(get_async_db),
+    loaders : Loaders = Depends(get_loaders),
     current_user : UserModel = Depends(jwt_manager.get_current_user)
 ) -> CommentSchema:
-    decision = await db.get(DecisionModel, new_comment.decision_id)
-    if decision is None:
+    decision = await loaders.load(DecisionModel, new_comment.decision_id)
+    if decision is None or not decision.is_active:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Решение не найдено или не активно")
     if new_comment.parent_id is not None:
-        parrent_comment = await db.scalar(
-            select(CommentModel)
-            .where(CommentModel.id == new_comment.parent_id, CommentModel.status == True)
-        )
-        if parrent_comment is None:
+        parrent_comment = await loaders.load(CommentModel, new_comment.parent_id)
+        if parrent_comment is None or not parrent_comment.status:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Коммент не найден")
     comment = CommentModel(
         text=new_comment.text,
@@ -41,6 +46,7 @@ async def create_comment(
     )
     
     db.add(comment)
+    await db.execute(bump_version([decision.id]))
     await db.commit()
     await db.refresh(comment)
     
@@ -48,13 +54,48 @@ async def create_comment(
     
 
 @router.get("/decision/{decision_id}", response_model=list[CommentSchema])
-async def comment_decision(decision_id: int, last_id : int | None = None, db: AsyncSession = Depends(get_async_db)):
+async def comment_decision(
+    decision_id: int,
+    request: Request,
+    last_id : int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user : UserModel | None = Depends(jwt_manager.get_current_user_optional),
+):
+    # комментарии и их голоса сдвигают version решения
+    state = (await db.execute(decision_state(decision_id, active_only=False))).first()
+    headers = None
+    if state is not None:
+        etag = make_etag(decision_id, *state, last_id or 0, current_user.id if current_user else 0)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        headers = etag_headers(etag)
+
+    # страница общая для всех, кто пришел за той же версией решения, голоса пользователя - отдельно.
+    # Соединение запроса возвращаем в пул до ожидания, см. get_decision_info
+    await db.commit()
+    items = await comment_page_flight.do(
+        ("comments", decision_id, last_id, *(state or (None, None))),
+        lambda: load_comment_page(decision_id, last_id),
+    )
+    my_votes = await my_comment_votes(
+        db, current_user.id if current_user else None, [item["id"] for item in items]
+    )
+    
+    return json_response(COMMENT_LIST, [
+        {**item, "my_vote": my_votes.get(item["id"])}
+        for item in items
+    ], headers)
+
 
+async def load_comment_page(decision_id: int, last_id: int | None) -> list[dict]:
+    """
+    Страница комментариев с голосами для comment_decision, в своей сессии, см. app.single_flight
+    """
     filters = [CommentModel.decision_id == decision_id, CommentModel.status == True]
     if last_id is not None:
         filters.append(CommentModel.id > last_id)
 
-    result = await db.execute(
+    stmt = (
         select(
             CommentModel,
             func.count(CommentVoteModel.user_id)
@@ -68,16 +109,9 @@ async def comment_decision(decision_id: int, last_id : int | None = None, db: As
         .order_by(CommentModel.created_at.asc())   
         .limit(50)
     )
-    
-    return [
-        CommentSchema(
-            id=comment.id, text=comment.text, decision_id=comment.decision_id,
-            user_id=comment.user_id, parent_id=comment.parent_id,
-            created_at=comment.created_at, updated_at=comment.updated_at,
-            status=comment.status, like=likes, dislike=dislikes
-        )
-        for comment, likes, dislikes in result.all()
-    ]
+    async with async_session_maker() as db:
+        rows = (await db.execute(stmt)).all()
+        return [comment_item(comment, likes, dislikes) for comment, likes, dislikes in rows]
 
 
 @router.post("/{comment_id}/like", status_code=status.HTTP_201_CREATED)
@@ -130,22 +164,12 @@ async def reply_comment(
     )
 
     rows = result.all()
+    my_votes = await my_comment_votes(db, current_user.id, [comment.id for comment, _, _ in rows])
 
-    return [
-        CommentSchema(
-            id=comment.id,
-            text=comment.text,
-            decision_id=comment.decision_id,
-            user_id=comment.user_id,
-            parent_id=comment.parent_id,
-            created_at=comment.created_at,
-            updated_at=comment.updated_at,
-            status=comment.status,
-            like=likes,
-            dislike=dislikes,
-        )
+    return json_response(COMMENT_LIST, [
+        comment_item(comment, likes, dislikes, my_votes.get(comment.id))
         for comment, likes, dislikes in rows
-    ]
+    ])
 
 @router.put("/{comment_id}", response_model=CommentSchema)
 async def update_comment(
@@ -166,6 +190,7 @@ async def update_comment(
     if comment.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Доступ запрещен")
     await db.execute(update(CommentModel).where(CommentModel.id == comment_id).values(**new_comment.model_dump()))
+    await db.execute(bump_version([comment.decision_id]))
     await db.commit()
     await db.refresh(comment)
     return comment
@@ -176,24 +201,20 @@ async def update_comment(
 async def delete_comment(
     comment_id: int,
     db: AsyncSession = Depends(get_async_db),
+    loaders: Loaders = Depends(get_loaders),
     current_user: UserModel = Depends(jwt_manager.get_current_user)
 ):
-    comment = await db.scalar(
-        select(CommentModel)
-        .where(CommentModel.id == comment_id, CommentModel.status.is_(True))
-        .options(joinedload(CommentModel.user))
-    )
-    if comment is None:
+    comment = await loaders.load(CommentModel, comment_id)
+    if comment is None or not comment.status:
         raise HTTPException(404, "Комментарий не найден")
     
-    target_user_role = comment.user.role
-    
      
     if current_user.role == "user":
         if current_user.id != comment.user_id:
             raise HTTPException(403, "Только свои!")
     
     elif current_user.role == "admin":
+        target_user_role = (await loaders.load(UserModel, comment.user_id)).role
         if target_user_role in ["admin", "super_admin"]:
             raise HTTPException(403, "Админы удаляют только юзеров!")
     
@@ -202,8 +223,9 @@ async def delete_comment(
     await db.execute(
         update(CommentModel)
         .where(CommentModel.id == comment_id)
-        .values(status=False)
+        .values(status=False, deleted_at=func.now())
     )
+    await db.execute(bump_version([comment.decision_id]))
     await db.commit()
     
     return Response(status_code=204)
@@ -217,14 +239,15 @@ async def hard_delete_comment(
 ):
     comment = await db.scalar(
         select(CommentModel)
-        .options(joinedload(CommentModel.user))
         .where(CommentModel.id == comment_id, CommentModel.status == False)
     )
+    if comment is None:
+        comment = await db.get(CommentArchiveModel, comment_id)
     
     if not comment:
         raise HTTPException(404, "Комментарий не найден")
     
-    target_role = comment.user.role
+    target_role = await db.run_sync(user_role, comment.user_id)
     
     if current_user.role == "user":
         if current_user.id != comment.user_id:
@@ -234,7 +257,8 @@ async def hard_delete_comment(
         if target_role in ("admin", "super_admin"):
             raise HTTPException(403, "Админы удаляют только юзеров!")
     
-     
+    # архивные ответы удаляем пока дерево целое, горячие удалит ON DELETE CASCADE
+    await db.run_sync(delete_archived_comments, lambda edges: edges.c.id == comment_id)
     await db.execute(
         delete(CommentModel)
         .where(CommentModel.id == comment_id)
@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+from fastapi import APIRouter, Depends, status, HTTPException, Request, Response
 from sqlalchemy import select, func, update, delete
-from sqlalchemy.orm import selectinload, joinedload
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db_depends import get_async_db
+from app.db_depends import get_async_db, get_loaders
+from app.dataloader import Loaders
 
-from app.models import DecisionModel, UserModel, DecisionVoteModel, DecisionHistoryModel
+from app.models import DecisionModel, UserModel, DecisionHistoryModel, DecisionHistoryArchiveModel
 
 from app.config import jwt_manager
 from app.schemas.decision_history import DecisionHistorySchema
 from app.schemas.decisions import DecisionDetailSchema
+from app.media import release_images
+from app.archive import decision_owner, user_role
+from app.etag import bump_version, decision_state, make_etag, etag_matches, not_modified, set_etag, HISTORY_CACHE_CONTROL
+from app import decision_repo
 
 router = APIRouter(
     prefix="/decisions_history",
@@ -19,33 +23,24 @@ router = APIRouter(
 @router.get("/{decision_id}/decision", response_model=DecisionDetailSchema)
 async def get_decision(
     decision_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_async_db),
     current_user : UserModel = Depends(jwt_manager.get_current_user)
 ) -> DecisionDetailSchema:
-    stmt = (
-        select(
-            DecisionModel,
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(True))
-            .label("like"),
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(False))
-            .label("dislike"),
-        )
-        .outerjoin(DecisionModel.votes)
-         
-        .where(
-            DecisionModel.id == decision_id,
-            DecisionModel.is_active.is_(True),
-        )
-        .group_by(DecisionModel.id)
-        .options(
-            selectinload(DecisionModel.decision_history.and_(DecisionHistoryModel.is_active == True))  
+    state = (await db.execute(decision_state(decision_id))).first()
+    if state is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Запись не найдена или не активна,возможно отсутствуют истории обновлений у записи",
         )
-    )
+    # новая история приходит вместе со сменой статуса (updated_at), скрытие истории сдвигает version
+    etag = make_etag(decision_id, *state)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
 
-    result = await db.execute(stmt)
-    row = result.first()
+    row = await decision_repo.decision_with_history(db, decision_id)
 
     if row is None:
         raise HTTPException(
@@ -60,6 +55,7 @@ async def get_decision(
         title=decision.title,
         description=decision.description,
         image_url=decision.image_url,
+        image_variants=decision.image_variants,
         user_id=decision.user_id,
         created_at=decision.created_at,
         updated_at=decision.updated_at,
@@ -74,16 +70,26 @@ async def get_decision(
 @router.get("/{decision_history_id}", response_model=DecisionHistorySchema)
 async def get_decision_history(
     decision_history_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_async_db),
     current_user: UserModel = Depends(jwt_manager.get_current_user)
 ) -> DecisionHistorySchema:
-    decision_history = await db.scalar(
-        select(DecisionHistoryModel)
-        .where(
-            DecisionHistoryModel.id == decision_history_id,
-            DecisionHistoryModel.is_active == True
-        )
+    active = (
+        DecisionHistoryModel.id == decision_history_id,
+        DecisionHistoryModel.is_active == True
     )
+    # снимок не меняется, тег по id. Скрытая или удаленная история - 404, а не 304 по старому тегу
+    if await db.scalar(select(DecisionHistoryModel.id).where(*active)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="История обновления не найдена или не активна"
+        )
+    etag = make_etag("history", decision_history_id)
+    if etag_matches(request, etag):
+        return not_modified(etag, HISTORY_CACHE_CONTROL)
+
+    decision_history = await db.scalar(select(DecisionHistoryModel).where(*active))
     
     if decision_history is None:
         raise HTTPException(
@@ -91,6 +97,7 @@ async def get_decision_history(
             detail="История обновления не найдена или не активна"
         )
     
+    set_etag(response, etag, HISTORY_CACHE_CONTROL)
     return decision_history
 
 
@@ -98,25 +105,16 @@ async def get_decision_history(
 async def delete_decision_history(
     decision_history_id: int,
     db: AsyncSession = Depends(get_async_db),
+    loaders: Loaders = Depends(get_loaders),
     current_user: UserModel = Depends(jwt_manager.get_current_user)
 ):
-    decision_history = await db.scalar(
-        select(DecisionHistoryModel)
-        .where(
-            DecisionHistoryModel.id == decision_history_id,
-            DecisionHistoryModel.is_active.is_(True)
-        )
-        .options(
-            joinedload(DecisionHistoryModel.decision)
-            .joinedload(DecisionModel.user)  
-        )
-    )
+    decision_history = await loaders.load(DecisionHistoryModel, decision_history_id)
     
-    if decision_history is None:
+    if decision_history is None or not decision_history.is_active:
         raise HTTPException(404, "История не найдена")
     
-    target_user_id = decision_history.decision.user_id
-    target_user_role = decision_history.decision.user.role   
+    decision = await loaders.load(DecisionModel, decision_history.decision_id)
+    target_user_id = decision.user_id
     
      
     if current_user.role == "user":
@@ -124,6 +122,7 @@ async def delete_decision_history(
             raise HTTPException(403, "Только свои!")
     
     elif current_user.role == "admin":
+        target_user_role = (await loaders.load(UserModel, target_user_id)).role
         if target_user_role == "admin" or target_user_role == "super_admin":
             raise HTTPException(403, "Админы удаляют только юзеров!")
     
@@ -132,8 +131,9 @@ async def delete_decision_history(
     await db.execute(
         update(DecisionHistoryModel)
         .where(DecisionHistoryModel.id == decision_history_id)
-        .values(is_active=False)
+        .values(is_active=False, deleted_at=func.now())
     )
+    await db.execute(bump_version([decision_history.decision_id]))
     await db.commit()
     
     return {"status": "success", "message": "История удалена"}
@@ -147,23 +147,22 @@ async def hard_delete_decision_history(
 ):
     decision_history = await db.scalar(
         select(DecisionHistoryModel)
-        .options(
-            joinedload(DecisionHistoryModel.decision)
-            .joinedload(DecisionModel.user)
-        )
         .where(
             DecisionHistoryModel.id == decision_history_id,
             DecisionHistoryModel.is_active == False
         )
     )
+    if decision_history is None:
+        decision_history = await db.get(DecisionHistoryArchiveModel, decision_history_id)
     
     if not decision_history:
         raise HTTPException(404, "История не найдена")
     
-    target_user_role = decision_history.decision.user.role
+    target_user_id = await db.run_sync(decision_owner, decision_history.decision_id)
+    target_user_role = await db.run_sync(user_role, target_user_id)
     
     if current_user.role == "user":
-        if current_user.id != decision_history.decision.user_id:
+        if current_user.id != target_user_id:
             raise HTTPException(403, "Только свои!")
     
     elif current_user.role == "admin":
@@ -174,6 +173,11 @@ async def hard_delete_decision_history(
         delete(DecisionHistoryModel)
         .where(DecisionHistoryModel.id == decision_history_id)
     )
+    await db.execute(
+        delete(DecisionHistoryArchiveModel)
+        .where(DecisionHistoryArchiveModel.id == decision_history_id)
+    )
     await db.commit()
+    await release_images(db, [decision_history.image_url])
     
     return {"status": "deleted", "message": "История удалена"}
@@ -1,19 +1,33 @@
-import uuid
+import json
+import asyncio
 
-from fastapi import APIRouter, Depends, status, HTTPException,UploadFile, File, Query
+from fastapi import APIRouter, Depends, status, HTTPException,UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
 
-from sqlalchemy import select, or_,  func, update, delete
-from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy import select, func, update, delete, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.schemas.decisions import DecisionCreateSchema, DecisionSchema, DecisionSearchSchema, DecisionUpdateSchema
-from app.models import DecisionModel, UserModel, DecisionVoteModel, DecisionHistoryModel
-from app.config import jwt_manager
-from app.db_depends import get_async_db
-from app.utilits import like, dislike, decision_making
+from app.schemas.decisions import DecisionCreateSchema, DecisionSchema, DecisionSearchSchema, DecisionUpdateSchema, ImageUploadRequestSchema, ImageUploadSchema, VoteTimelineSchema, DecisionBatchItemSchema
+from app.models import DecisionModel, UserModel, DecisionVoteModel, DecisionHistoryModel, DecisionArchiveModel, DecisionHistoryArchiveModel
+from app.config import jwt_manager, vote_broadcaster
+from app.db_depends import get_async_db, get_loaders
+from app.dataloader import Loaders
+from app.utilits import like, dislike, decision_making, decision_counters, my_decision_votes
 from app.validation.depends_role import get_admin_user
+from app.media import save_image, release_images, presign_image_upload, resolve_uploaded_image
+from app.image_variants import generate_image_variants
+from app.archive import user_role, delete_archived_decisions
+from app.trending import hot_score, update_score, remove_score, trending_ids
+from app.vote_hours import vote_timeline
+from app.etag import decision_state, make_etag, etag_matches, not_modified, set_etag
+from app.serialization import (
+    json_response, decision_item, parse_fields, items_include, DECISION_LIST, DECISION_PAGE, DECISION_BATCH
+)
+from app.compression import no_compression
+from app.single_flight import SingleFlight
+from app import decision_repo
+from app.database import async_session_maker
 
-from pathlib import Path
 from datetime import datetime, timedelta, timezone
 
 
@@ -22,50 +36,50 @@ router = APIRouter(
     tags=["Decisions"]
 )
 
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-MEDIA_ROOT = BASE_DIR / "media" / "decisions"
-MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
-ALLOWED_EXTENSIONS = {"image/png", "image/jpg", "image/jpeg"}
-MAX_SIZE = 2 * 1024 * 1024
-
-async def save_image(file : UploadFile):
-    if file.content_type not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неподходящий формат файла")
-    content = await file.read()
-    if len(content) > MAX_SIZE:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Файл слишком большой")
-    extension = Path(file.filename or "").suffix.lower() or "jpg"
-    filename = f"{uuid.uuid4()}{extension}"
-    file_path = MEDIA_ROOT / filename
-    file_path.write_bytes(content)
-    return f"/media/decisions/{filename}"
-
-
-
-
+BATCH_LIMIT = 300 #id в одном запросе /decisions/batch
+MAX_ID = 2**31 - 1 #id - integer в postgres, больше не влезет в ARRAY(Integer)
+decision_info_flight = SingleFlight("decision_info")
 
+@router.post("/uploads", response_model=ImageUploadSchema)
+async def request_image_upload(
+    upload : ImageUploadRequestSchema,
+    current_user : UserModel = Depends(jwt_manager.get_current_user),
+) -> ImageUploadSchema:
+    """
+    Прямая загрузка картинки в хранилище, минуя API: клиент делает запрос из upload,
+    затем передает image_key в форму решения
+    """
+    return await presign_image_upload(upload.sha256, upload.size, upload.content_type)
 
 
 @router.post("/",response_model=DecisionSchema, status_code=status.HTTP_201_CREATED)
 async def add_decision(
     decision : DecisionCreateSchema = Depends(DecisionCreateSchema.as_form),
     image : UploadFile | None = File(None),
+    image_key : str | None = Form(None),
     db : AsyncSession = Depends(get_async_db),
     current_user : UserModel = Depends(jwt_manager.get_current_user),
 ):
     new_decision = DecisionModel(
         **decision.model_dump(),
-        user_id = current_user.id,        
+        user_id = current_user.id,
+        hot_score = hot_score(0, datetime.now(timezone.utc)),
     )
     if image:
         image_url = await save_image(image)
         new_decision.image_url = image_url
+    elif image_key:
+        new_decision.image_url = await resolve_uploaded_image(image_key)
     db.add(new_decision)
+    await db.execute(decision_counters(current_user.id, in_processing=1))
     await db.commit()
     await db.refresh(new_decision)
+    await update_score(new_decision.id, new_decision.hot_score)
 
     eta = datetime.now(timezone.utc) + timedelta(days=7)
     decision_making.apply_async(args=[new_decision.id], eta=eta)
+    if new_decision.image_url:
+        generate_image_variants.delay(new_decision.id, new_decision.image_url)
     return new_decision
     
 
@@ -82,93 +96,35 @@ async def search_decisions(
         pattern=r"^(in_processing|ready)$",
         description="Статус [in_processing|ready]"
     ),
+    fields: str | None = Query(None, description="Поля карточки через запятую, например id,title,image_url,like,dislike"),
     db: AsyncSession = Depends(get_async_db),
     current_user : UserModel = Depends(jwt_manager.get_current_user)
 ) -> DecisionSearchSchema:
     
     PAGE_SIZE = 20
+    selected = parse_fields(fields)
 
-    filters = [DecisionModel.is_active.is_(True)]
-
-    if status:
-        filters.append(DecisionModel.status == status)
-
-    rank = None
-
-    if search:
-        search_value = search.strip()
-        if search_value:
-            ts_query_ru = func.websearch_to_tsquery("russian", search_value)
-            ts_query_en = func.websearch_to_tsquery("english", search_value)
-
-            fst_search = or_(
-                DecisionModel.tsv.op("@@")(ts_query_ru),
-                DecisionModel.tsv.op("@@")(ts_query_en),
-            )
-
-            trigram_search = or_(
-                DecisionModel.title.op("%")(search_value),
-                func.similarity(DecisionModel.title, search_value) > 0.15,
-            )
-
-            filters.append(or_(fst_search, trigram_search))
-
-            rank = func.greatest(
-                func.ts_rank_cd(DecisionModel.tsv, ts_query_ru),
-                func.ts_rank_cd(DecisionModel.tsv, ts_query_en),
-                func.similarity(DecisionModel.title, search_value) * 0.5,
-            )
-
-    stmt = (
-        select(
-            DecisionModel,
-
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(True))
-            .label("like"),
-
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(False))
-            .label("dislike"),
-        )
-        .outerjoin(DecisionModel.votes)
-        .where(*filters)
-        .group_by(DecisionModel.id)
-        .limit(PAGE_SIZE)
-        .offset((page - 1) * PAGE_SIZE)
+    rows = await decision_repo.search_decisions(
+        db, search=search, status=status, page=page, page_size=PAGE_SIZE, fields=selected
     )
-
-    if rank is not None:
-        stmt = stmt.order_by(rank.desc())
-    else:
-        stmt = stmt.order_by(DecisionModel.created_at.desc())
-
-    result = await db.execute(stmt)
-    rows = result.all()
+    my_votes = {}
+    if selected is None or "my_vote" in selected:
+        my_votes = await my_decision_votes(db, current_user.id, [decision.id for decision, _, _ in rows])
 
     items = [
-        DecisionSchema(
-            id=decision.id,
-            title=decision.title,
-            description=decision.description,
-            image_url=decision.image_url,
-            user_id=decision.user_id,
-            created_at=decision.created_at,
-            updated_at=decision.updated_at,
-            status=decision.status,
-            is_active=decision.is_active,
-            like=like,
-            dislike=dislike,
-        )
+        decision_item(decision, like, dislike, my_votes.get(decision.id), selected)
         for decision, like, dislike in rows
     ]
 
-    return DecisionSearchSchema(
-        page=page,
-        page_size=PAGE_SIZE,
-        total_size=len(items),
-        items=items,
-    )
+    include = None
+    if selected is not None:
+        include = {"page": True, "page_size": True, "total_size": True, "items": items_include(selected)}
+    return json_response(DECISION_PAGE, {
+        "page": page,
+        "page_size": PAGE_SIZE,
+        "total_size": len(items),
+        "items": items,
+    }, include=include)
 
 
 
@@ -180,6 +136,7 @@ async def update_decision(
     decision_id : int,
     new_decision : DecisionCreateSchema = Depends(DecisionUpdateSchema.as_form),
     image : UploadFile | None = File(None),
+    image_key : str | None = Form(None),
     db : AsyncSession = Depends(get_async_db),
     current_user : UserModel = Depends(jwt_manager.get_current_user)
 ) -> DecisionSchema:
@@ -192,86 +149,217 @@ async def update_decision(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Запись не найдена или не активна")
     if decision.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Доступ запрещен")
+    old_image_url = decision.image_url
     if image:
         decision.image_url = await save_image(image)
+    elif image_key:
+        decision.image_url = await resolve_uploaded_image(image_key)
+    image_changed = decision.image_url != old_image_url
+    if image_changed:
+        decision.image_variants = None #до готовности копий отдаем оригинал
      
     await db.execute(update(DecisionModel).where(DecisionModel.id == decision_id).values(**new_decision.model_dump()))
     await db.commit()
     await db.refresh(decision)
+    if image_changed:
+        generate_image_variants.delay(decision.id, decision.image_url)
+        await release_images(db, [old_image_url])
      
     return decision
     
 
 
-@router.get("/{decision_id}", response_model=DecisionSchema)
-async def get_decision_info(
-    decision_id: int,
+@router.get("/trending", response_model=list[DecisionSchema])
+async def get_trending_decisions(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
     db: AsyncSession = Depends(get_async_db),
     current_user : UserModel = Depends(jwt_manager.get_current_user)
-) -> DecisionSchema:
+) -> list[DecisionSchema]:
+    """
+    Горячие решения: страница id из индекса trending (O(log n)),
+    затем один запрос за решениями и их голосами
+    """
+    ids = await trending_ids(offset, limit)
+    if ids is None:
+        ids = (await db.scalars(
+            select(DecisionModel.id)
+            .where(DecisionModel.is_active.is_(True))
+            .order_by(DecisionModel.hot_score.desc())
+            .offset(offset)
+            .limit(limit)
+        )).all()
+    if not ids:
+        return []
+
+    rows = await decision_repo.decisions_with_votes(db, ids)
+    my_votes = await my_decision_votes(db, current_user.id, list(rows))
+
+    # порядок из индекса, скрытые после попадания в индекс решения пропускаем
+    return json_response(DECISION_LIST, [
+        decision_item(decision, like, dislike, my_votes.get(decision.id))
+        for decision, like, dislike in (rows[decision_id] for decision_id in ids if decision_id in rows)
+    ])
+
+
+@router.get("/unvoted", response_model=list[DecisionSchema])
+async def get_unvoted_decisions(
+    last_id: int | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user : UserModel = Depends(jwt_manager.get_current_user)
+) -> list[DecisionSchema]:
+    """
+    Открытые решения, за которые пользователь еще не голосовал, от новых к старым.
+    Страница id: NOT EXISTS по uq_user_decision_vote и keyset по decisions_in_processing_created_at_id,
+    без OFFSET и без чтения всех голосов пользователя. Затем голоса только для страницы
+    """
+    filters = [
+        DecisionModel.is_active.is_(True),
+        DecisionModel.status == "in_processing",
+        ~select(DecisionVoteModel.id)
+        .where(
+            DecisionVoteModel.user_id == current_user.id,
+            DecisionVoteModel.decision_id == DecisionModel.id,
+        )
+        .exists(),
+    ]
+    if last_id is not None:
+        last_created_at = await db.scalar(select(DecisionModel.created_at).where(DecisionModel.id == last_id))
+        if last_created_at is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный курсор")
+        filters.append(tuple_(DecisionModel.created_at, DecisionModel.id) < tuple_(last_created_at, last_id))
 
-    stmt = (
-        select(
-            DecisionModel,
+    ids = (await db.scalars(
+        select(DecisionModel.id)
+        .where(*filters)
+        .order_by(DecisionModel.created_at.desc(), DecisionModel.id.desc())
+        .limit(limit)
+    )).all()
+    if not ids:
+        return []
 
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(True))
-            .label("like"),
+    rows = await decision_repo.decisions_with_votes(db, ids)
 
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(False))
-            .label("dislike"),
-        )
-        .outerjoin(DecisionModel.votes)  
-        .where(
-            DecisionModel.id == decision_id,
-            DecisionModel.is_active.is_(True),
+    return json_response(DECISION_LIST, [
+        decision_item(decision, like, dislike)
+        for decision, like, dislike in (rows[decision_id] for decision_id in ids if decision_id in rows)
+    ])
+
+
+@router.get("/batch", response_model=list[DecisionBatchItemSchema])
+async def get_decisions_batch(
+    ids: str = Query(..., description=f"id решений через запятую, не больше {BATCH_LIMIT}"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user : UserModel = Depends(jwt_manager.get_current_user)
+) -> list[DecisionBatchItemSchema]:
+    """
+    Несколько решений одним запросом: id = ANY(:ids), голоса и голос пользователя
+    в том же запросе. Ответ в порядке ids, ненайденные и скрытые с found=false
+    """
+    try:
+        requested = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный список id")
+    if any(not 0 < decision_id <= MAX_ID for decision_id in requested):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"id должны быть от 1 до {MAX_ID}")
+    if not requested or len(requested) > BATCH_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Нужно от 1 до {BATCH_LIMIT} id",
         )
-        .group_by(DecisionModel.id)
-    )
 
-    result = await db.execute(stmt)
-    row = result.first()
+    rows = await decision_repo.decisions_with_my_vote(db, requested, current_user.id)
+    found = {
+        decision.id: decision_item(decision, like, dislike, my_vote)
+        for decision, like, dislike, my_vote in rows
+    }
 
-    if row is None:
+    return json_response(DECISION_BATCH, [
+        {"id": decision_id, "found": decision_id in found, "decision": found.get(decision_id)}
+        for decision_id in requested
+    ])
+
+
+@router.get("/{decision_id}", response_model=DecisionSchema)
+async def get_decision_info(
+    decision_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user : UserModel = Depends(jwt_manager.get_current_user)
+) -> DecisionSchema:
+    state = (await db.execute(decision_state(decision_id))).first()
+    if state is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Запись не найдена или не активна",
         )
+    # my_vote у каждого свой, поэтому в теге id пользователя
+    etag = make_etag(decision_id, *state, current_user.id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
+    # агрегация общая для всех, кто пришел за той же версией решения, голос пользователя - отдельно.
+    # Соединение запроса возвращаем в пул до ожидания: загрузка берет свое, и запрос
+    # не должен держать одно соединение, пока ждет второе
+    await db.commit()
+    item = await decision_info_flight.do(("decision", decision_id, *state), lambda: load_decision_info(decision_id))
+    if item is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Запись не найдена или не активна",
+        )
+    my_votes = await my_decision_votes(db, current_user.id, [decision_id])
+
+    return DecisionSchema(**{**item, "my_vote": my_votes.get(decision_id)})
+
 
-    decision, like, dislike = row
-
-    return DecisionSchema(
-        id=decision.id,
-        title=decision.title,
-        description=decision.description,
-        image_url=decision.image_url,
-        user_id=decision.user_id,
-        created_at=decision.created_at,
-        updated_at=decision.updated_at,
-        status=decision.status,
-        is_active=decision.is_active,
-        like=like,
-        dislike=dislike,
+async def load_decision_info(decision_id: int) -> dict | None:
+    """
+    Решение с голосами для get_decision_info. Своя сессия: результат делят
+    одновременные запросы, и любой из них может завершиться раньше загрузки
+    """
+    async with async_session_maker() as db:
+        row = await decision_repo.decision_with_votes(db, decision_id)
+        if row is None:
+            return None
+        decision, like, dislike = row
+        return decision_item(decision, like, dislike)
+
+
+@router.get("/{decision_id}/timeline", response_model=VoteTimelineSchema)
+async def get_decision_timeline(
+    decision_id: int,
+    hours: int = Query(24 * 7, ge=1, le=24 * 30, description="За сколько последних часов"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user : UserModel = Depends(jwt_manager.get_current_user)
+) -> VoteTimelineSchema:
+    """
+    Лайки и дизлайки по часам из таблицы decision_vote_hours, без чтения самих голосов
+    """
+    found = await db.scalar(
+        select(DecisionModel.id)
+        .where(DecisionModel.id == decision_id, DecisionModel.is_active.is_(True))
     )
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Запись не найдена или не активна")
+    since, points = await vote_timeline(db, decision_id, hours)
+    return VoteTimelineSchema(decision_id=decision_id, since=since, points=points)
 
 
 @router.delete("/{decision_id}")
 async def delete_decision(
     decision_id: int,
     db: AsyncSession = Depends(get_async_db),
+    loaders: Loaders = Depends(get_loaders),
     current_user: UserModel = Depends(jwt_manager.get_current_user)
 ):
-    decision = await db.scalar(
-        select(DecisionModel)
-        .where(DecisionModel.id == decision_id, DecisionModel.is_active.is_(True))
-        .options(joinedload(DecisionModel.user))
-        .options(selectinload(DecisionModel.decision_history))
-    )
-    if decision is None:
+    decision = await loaders.load(DecisionModel, decision_id)
+    if decision is None or not decision.is_active:
         raise HTTPException(404, "Решение не найдено")
     
-    target_user_role = decision.user.role   
     
     
     if current_user.role == "user":
@@ -279,6 +367,8 @@ async def delete_decision(
             raise HTTPException(403, "Только свои!")
     
     elif current_user.role == "admin":
+        # роль автора нужна только админу, свое решение берется из сессии (current_user) без запроса
+        target_user_role = (await loaders.load(UserModel, decision.user_id)).role
         if target_user_role in ["admin", "super_admin"]:
             raise HTTPException(403, "Админы удаляют только юзеров!")
     
@@ -287,15 +377,18 @@ async def delete_decision(
     
     await db.execute(
         update(DecisionHistoryModel)
-        .where(DecisionHistoryModel.decision_id == decision.id)
-        .values(is_active=False)
+        .where(DecisionHistoryModel.decision_id == decision.id, DecisionHistoryModel.is_active.is_(True))
+        .values(is_active=False, deleted_at=func.now())
     )
-    await db.execute(
+    result = await db.execute(
         update(DecisionModel)
-        .where(DecisionModel.id == decision_id)
-        .values(is_active=False)
+        .where(DecisionModel.id == decision_id, DecisionModel.is_active.is_(True))
+        .values(is_active=False, deleted_at=func.now())
     )
+    if result.rowcount:
+        await db.execute(decision_counters(decision.user_id, **{decision.status: -1}))
     await db.commit()
+    await remove_score(decision_id)
     
     return {"status": "success", "message": "Решение помечено неактивным"}
 
@@ -349,6 +442,44 @@ async def dislike_decision(
     return {"status": "success", "is_like" : result}
 
 
+@router.get("/{decision_id}/votes/stream")
+@no_compression
+async def stream_decision_votes(
+    decision_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(jwt_manager.get_current_user)
+):
+    """
+    Подписка (Server-Sent Events) на счетчики лайков/дизлайков решения
+    """
+    row = await decision_repo.vote_counts(db, decision_id)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Запись не найдена")
+    await db.close() #не держим соединение из пула пока открыт стрим
+    queue = vote_broadcaster.subscribe(decision_id)
+    initial = {"decision_id": decision_id, "like": row.like, "dislike": row.dislike}
+
+    async def events():
+        try:
+            yield f"data: {json.dumps(initial)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n" #чтобы прокси не закрывали соединение
+                    continue
+                yield f"data: {json.dumps(message)}\n\n"
+        finally:
+            vote_broadcaster.unsubscribe(decision_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
     
     
 
@@ -379,121 +510,75 @@ async def rolback_decision(
 
 
 
+    old_image_url = decision.image_url
+    image_changed = old_image_url != decision_hisory.image_url
     decision.title = decision_hisory.title
     decision.description = decision_hisory.description
     decision.image_url = decision_hisory.image_url
+    if image_changed:
+        decision.image_variants = None
 
     await db.commit()
     await db.refresh(decision)
+    if image_changed and decision.image_url:
+        generate_image_variants.delay(decision.id, decision.image_url)
+    if image_changed:
+        await release_images(db, [old_image_url])
     return decision
 
 
 @router.get("/ready/{user_id}/user", response_model=list[DecisionSchema])
-async def get_user_decisions(
+async def get_user_ready_decisions(
     user_id : int,
     last_id : int | None = None,
+    fields: str | None = Query(None, description="Поля карточки через запятую, например id,title,image_url,like,dislike"),
     db : AsyncSession = Depends(get_async_db),
     current_user : UserModel = Depends(jwt_manager.get_current_user)
 )-> list[DecisionSchema]:
+    selected = parse_fields(fields)
     user = await db.scalar(select(UserModel).where(
         UserModel.is_active == True,
         UserModel.id == user_id
     ))
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
-    filters = [DecisionModel.is_active == True, DecisionModel.user_id == user_id, DecisionModel.status == "ready"]
-    if last_id is not None:
-        filters.append(DecisionModel.id > last_id)
-    request_decision = await db.execute(
-        select(
-            DecisionModel,
-            
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(True))
-            .label("like"),
-
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(False))
-            .label("dislike"),
-        )
-        .outerjoin(DecisionModel.votes)
-        .where(*filters)
-        .group_by(DecisionModel.id)
-        .order_by(DecisionModel.created_at.asc())
-        .limit(30)
-      
+    rows = await decision_repo.user_decisions(
+        db, user_id=user_id, status="ready", last_id=last_id, limit=30, fields=selected
     )
-    rows = request_decision.all()
-    return [
-        DecisionSchema(
-            id=decision.id,
-            title=decision.title,
-            description=decision.description,
-            image_url=decision.image_url,
-            user_id=decision.user_id,
-            created_at=decision.created_at,
-            updated_at=decision.updated_at,
-            status=decision.status,
-            is_active=decision.is_active,
-            like=like,
-            dislike=dislike,
-        )
+    my_votes = {}
+    if selected is None or "my_vote" in selected:
+        my_votes = await my_decision_votes(db, current_user.id, [decision.id for decision, _, _ in rows])
+    return json_response(DECISION_LIST, [
+        decision_item(decision, like, dislike, my_votes.get(decision.id), selected)
         for decision, like, dislike in rows
-    ]
+    ], include=items_include(selected))
 
 
 @router.get("/unaccepted_decisions/{user_id}/user", response_model=list[DecisionSchema])
-async def get_user_decisions(
+async def get_user_unaccepted_decisions(
     user_id : int,
     last_id : int | None = None,
+    fields: str | None = Query(None, description="Поля карточки через запятую, например id,title,image_url,like,dislike"),
     db : AsyncSession = Depends(get_async_db),
     current_user : UserModel = Depends(jwt_manager.get_current_user)
 )-> list[DecisionSchema]:
+    selected = parse_fields(fields)
     user = await db.scalar(select(UserModel).where(
         UserModel.is_active == True,
         UserModel.id == user_id
     ))
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
-    filters = [DecisionModel.is_active == True, DecisionModel.user_id == user_id, DecisionModel.status == "in_processing"]
-    if last_id is not None:
-        filters.append(DecisionModel.id > last_id)
-    request_decision = await db.execute(
-        select(
-            DecisionModel,
-            
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(True))
-            .label("like"),
-
-            func.count(DecisionVoteModel.user_id)
-            .filter(DecisionVoteModel.is_like.is_(False))
-            .label("dislike"),
-        )
-        .outerjoin(DecisionModel.votes)
-        .where(*filters)
-        .group_by(DecisionModel.id)
-        .order_by(DecisionModel.created_at.asc())
-        .limit(30)
-      
+    rows = await decision_repo.user_decisions(
+        db, user_id=user_id, status="in_processing", last_id=last_id, limit=30, fields=selected
     )
-    rows = request_decision.all()
-    return [
-        DecisionSchema(
-            id=decision.id,
-            title=decision.title,
-            description=decision.description,
-            image_url=decision.image_url,
-            user_id=decision.user_id,
-            created_at=decision.created_at,
-            updated_at=decision.updated_at,
-            status=decision.status,
-            is_active=decision.is_active,
-            like=like,
-            dislike=dislike,
-        )
+    my_votes = {}
+    if selected is None or "my_vote" in selected:
+        my_votes = await my_decision_votes(db, current_user.id, [decision.id for decision, _, _ in rows])
+    return json_response(DECISION_LIST, [
+        decision_item(decision, like, dislike, my_votes.get(decision.id), selected)
         for decision, like, dislike in rows
-    ]
+    ], include=items_include(selected))
     
     
 @router.delete("/{decision_id}/hard")
@@ -504,15 +589,16 @@ async def hard_delete_decision(
 ):
     decision = await db.scalar(
         select(DecisionModel)
-        .options(joinedload(DecisionModel.user))
         .where(DecisionModel.id == decision_id, DecisionModel.is_active == False)
     )
+    if decision is None:
+        decision = await db.get(DecisionArchiveModel, decision_id)
     
     if not decision:
         raise HTTPException(404, "Решение не найдено")
     
      
-    target_role = decision.user.role
+    target_role = await db.run_sync(user_role, decision.user_id)
     
     if current_user.role == "user":
         if current_user.id != decision.user_id:
@@ -524,8 +610,14 @@ async def hard_delete_decision(
     
      
     
-    await db.delete(decision)   
+    image_urls = [decision.image_url, *await db.scalars(
+        select(DecisionHistoryModel.image_url).where(DecisionHistoryModel.decision_id == decision_id)
+    )]
+    image_urls += await db.run_sync(delete_archived_decisions, [decision_id])
+    # голоса, истории и комментарии удалит база через ON DELETE CASCADE
+    await db.execute(delete(DecisionModel).where(DecisionModel.id == decision_id))
     await db.commit()
+    await release_images(db, image_urls)
     
     return {"status": "deleted", "message": "Решение + истории удалены"}
 
@@ -538,17 +630,15 @@ async def hard_delete_decision_history_all(
 ):
     decision = await db.scalar(
         select(DecisionModel)
-        .options(
-            joinedload(DecisionModel.user),
-            selectinload(DecisionModel.decision_history)
-        )
         .where(DecisionModel.id == decision_id, DecisionModel.is_active == False)
     )
+    if decision is None:
+        decision = await db.get(DecisionArchiveModel, decision_id)
     
     if not decision:
         raise HTTPException(404, "Решение не найдено")
     
-    target_role = decision.user.role
+    target_role = await db.run_sync(user_role, decision.user_id)
     
     if current_user.role == "user":
         if current_user.id != decision.user_id:
@@ -559,123 +649,19 @@ async def hard_delete_decision_history_all(
             raise HTTPException(403, "Админы удаляют только юзеров!")
     
     
-    await db.execute(delete(DecisionHistoryModel).where(DecisionHistoryModel.decision_id == decision_id))
+    image_urls = await db.scalars(
+        delete(DecisionHistoryModel)
+        .where(DecisionHistoryModel.decision_id == decision_id)
+        .returning(DecisionHistoryModel.image_url)
+    )
+    image_urls = image_urls.all()
+    archived_urls = await db.scalars(
+        delete(DecisionHistoryArchiveModel)
+        .where(DecisionHistoryArchiveModel.decision_id == decision_id)
+        .returning(DecisionHistoryArchiveModel.image_url)
+    )
+    image_urls += archived_urls.all()
     await db.commit()
+    await release_images(db, image_urls)
     
     return {"status": "deleted" }
-
-
-class DecisionRepo:
-    async def search(
-        self,
-        db: AsyncSession,
-        *,
-        filters: list,
-        page: int,
-        page_size: int,
-        rank=None,
-    ) -> DecisionSearchSchema:
-        stmt = (
-            select(
-                DecisionModel,
-
-                func.count(DecisionVoteModel.user_id)
-                .filter(DecisionVoteModel.is_like.is_(True))
-                .label("like"),
-
-                func.count(DecisionVoteModel.user_id)
-                .filter(DecisionVoteModel.is_like.is_(False))
-                .label("dislike"),
-            )
-            .outerjoin(DecisionModel.votes)
-            .where(*filters)
-            .group_by(DecisionModel.id)
-            .limit(page_size)
-            .offset((page - 1) * page_size)
-        )
-
-        if rank is not None:
-            stmt = stmt.order_by(rank.desc())
-        else:
-            stmt = stmt.order_by(DecisionModel.created_at.desc())
-
-        result = await db.execute(stmt)
-        rows = result.all()
-
-        items = [
-            DecisionSchema(
-                id=decision.id,
-                title=decision.title,
-                description=decision.description,
-                image_url=decision.image_url,
-                user_id=decision.user_id,
-                created_at=decision.created_at,
-                updated_at=decision.updated_at,
-                status=decision.status,
-                is_active=decision.is_active,
-                like=like,
-                dislike=dislike,
-            )
-            for decision, like, dislike in rows
-        ]
-
-        return DecisionSearchSchema(
-            page=page,
-            page_size=page_size,
-            total_size=len(items),
-            items=items,
-        )
-
-
-class DecisionService:
-    def __init__(self, repo=None):
-        self.repo = repo or DecisionRepo()
-
-    async def search(
-        self,
-        db: AsyncSession,
-        *,
-        page: int,
-        search: str | None,
-        status_value: str | None,
-    ) -> DecisionSearchSchema:
-
-        PAGE_SIZE = 20
-        filters = [DecisionModel.is_active.is_(True)]
-
-        if status_value:
-            filters.append(DecisionModel.status == status_value)
-
-        rank = None
-
-        if search:
-            search_value = search.strip()
-            if search_value:
-                ts_query_ru = func.websearch_to_tsquery("russian", search_value)
-                ts_query_en = func.websearch_to_tsquery("english", search_value)
-
-                fst_search = or_(
-                    DecisionModel.tsv.op("@@")(ts_query_ru),
-                    DecisionModel.tsv.op("@@")(ts_query_en),
-                )
-
-                trigram_search = or_(
-                    DecisionModel.title.op("%") (search_value),
-                    func.similarity(DecisionModel.title, search_value) > 0.15,
-                )
-
-                filters.append(or_(fst_search, trigram_search))
-
-                rank = func.greatest(
-                    func.ts_rank_cd(DecisionModel.tsv, ts_query_ru),
-                    func.ts_rank_cd(DecisionModel.tsv, ts_query_en),
-                    func.similarity(DecisionModel.title, search_value) * 0.5,
-                )
-
-        return await self.repo.search(
-            db,
-            filters=filters,
-            page=page,
-            page_size=PAGE_SIZE,
-            rank=rank,
-        )
@@ -0,0 +1,81 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import UserModel
+from app.schemas.stats import DecisionStatsSchema
+from app.db_depends import get_async_db
+from app.config import jwt_manager
+from app.decision_stats import decision_stats, refreshed_at
+from app.serialization import json_response, DECISION_STATS_LIST
+from app.single_flight import single_flight_stats
+
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["Stats"]
+)
+
+
+def check_admin(current_user: UserModel) -> None:
+    if current_user.role == "user":
+        raise HTTPException(403, "Только для админов")
+
+
+@router.get("/decisions", response_model=list[DecisionStatsSchema])
+async def get_decision_stats(
+    sort: Literal["likes", "dislikes", "comments", "history_count"] = "likes",
+    user_id: int | None = None,
+    status: str | None = Query(None, pattern=r"^(in_processing|ready)$"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(jwt_manager.get_current_user)
+) -> list[DecisionStatsSchema]:
+    """
+    Счетчики по решениям из материализованного представления decision_stats.
+    Данные отстают на интервал обновления, время пересчета в refreshed_at
+    """
+    check_admin(current_user)
+    filters = []
+    if user_id is not None:
+        filters.append(decision_stats.c.user_id == user_id)
+    if status:
+        filters.append(decision_stats.c.status == status)
+    result = await db.execute(
+        select(decision_stats, refreshed_at())
+        .where(*filters)
+        .order_by(decision_stats.c[sort].desc(), decision_stats.c.decision_id.desc())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+    )
+    return json_response(DECISION_STATS_LIST, result.mappings().all())
+
+
+@router.get("/decisions/{decision_id}", response_model=DecisionStatsSchema)
+async def get_one_decision_stats(
+    decision_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(jwt_manager.get_current_user)
+) -> DecisionStatsSchema:
+    check_admin(current_user)
+    result = await db.execute(select(decision_stats, refreshed_at()).where(decision_stats.c.decision_id == decision_id))
+    row = result.mappings().first()
+    if row is None:
+        raise HTTPException(404, "Статистика по решению не найдена")
+    return row
+
+
+@router.get("/single-flight")
+async def get_single_flight_stats(
+    current_user: UserModel = Depends(jwt_manager.get_current_user)
+) -> dict[str, dict]:
+    """
+    Склейка одинаковых чтений с запуска процесса: calls - вызовы, shared - дождались
+    чужой загрузки, ratio = shared / calls. Счетчики свои у каждого воркера
+    """
+    check_admin(current_user)
+    return single_flight_stats()
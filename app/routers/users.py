@@ -1,22 +1,90 @@
+from typing import Literal
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from sqlalchemy import select, func, update, delete
+from sqlalchemy import select, func, update, delete, tuple_
 from sqlalchemy.orm import selectinload, outerjoin
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.schemas.users import UserCreateSchema, UserSchema, UserDetailSchema, ChangePasswordSchema, ChangeEmailSchema, RoleUpdateSchema
-from app.models import UserModel, DecisionModel
+from app.schemas.users import UserCreateSchema, UserSchema, UserDetailSchema, ChangePasswordSchema, ChangeEmailSchema, RoleUpdateSchema, UserJobSchema, LeaderboardSchema
+from app.models import UserModel, DecisionModel, DecisionHistoryModel, DecisionVoteModel, UserJobModel, UserArchiveModel
 from app.db_depends import get_async_db
 from app.validation.hash_password import hash_password,verify_password
 from app.config import jwt_manager
+from app.media import release_images
+from app.user_jobs import cascade_user_deactivation, purge_user, purge_is_large, PURGE_STAGES
+from app.archive import delete_archived_user, rescore_decisions, rescored_scores
+from app.trending import update_score
+from app.leaderboard import get_leaderboard
+from app.serialization import json_response, USER_LIST, USER_JOB_LIST
 
 router = APIRouter(
     prefix="/users",
     tags=["Users"]
 )
 
+
+async def user_image_urls(db: AsyncSession, user_id: int) -> list[str]:
+    """
+    Картинки решений пользователя и их историй, для освобождения после удаления
+    """
+    decisions = select(DecisionModel.image_url).where(DecisionModel.user_id == user_id)
+    history = (
+        select(DecisionHistoryModel.image_url)
+        .join(DecisionModel, DecisionModel.id == DecisionHistoryModel.decision_id)
+        .where(DecisionModel.user_id == user_id)
+    )
+    result = await db.scalars(decisions.union(history))
+    return result.all()
+
+
+async def deactivate(db: AsyncSession, user_id: int) -> UserJobModel:
+    """
+    Деактивирует пользователя и ставит в очередь скрытие его контента пачками
+    """
+    await db.execute(
+        update(UserModel)
+        .where(UserModel.id == user_id)
+        .values(is_active=False, deleted_at=func.now())
+    )
+    job = UserJobModel(user_id=user_id, kind="deactivation")
+    db.add(job)
+    await db.commit()
+    cascade_user_deactivation.delay(job.id)
+    return job
+
+
+async def purge(db: AsyncSession, user_id: int):
+    """
+    Полное удаление пользователя одним DELETE, зависимые строки удаляет база (ON DELETE CASCADE).
+    Большие аккаунты удаляются фоновой задачей пачками
+    """
+    if await db.run_sync(purge_is_large, user_id):
+        job = UserJobModel(user_id=user_id, kind="purge", stage=PURGE_STAGES[0])
+        db.add(job)
+        await db.commit()
+        purge_user.delay(job.id)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "accepted", "message": "Удаление запущено в фоне", "job_id": job.id}
+        )
+    image_urls = await user_image_urls(db, user_id)
+    image_urls += await db.run_sync(delete_archived_user, user_id)
+    voted = (await db.scalars(
+        select(DecisionVoteModel.decision_id).where(DecisionVoteModel.user_id == user_id).distinct()
+    )).all()
+    await db.execute(delete(UserModel).where(UserModel.id == user_id))
+    # голоса удалил ON DELETE CASCADE мимо vote(): пересчитываем решения, за которые он голосовал
+    await db.run_sync(rescore_decisions, voted)
+    await db.commit()
+    for rescored_id, score in rescored_scores(db).items():
+        await update_score(rescored_id, score)
+    await release_images(db, image_urls)
+    return None
+
+
 @router.post("/", response_model=UserSchema, status_code=status.HTTP_201_CREATED)
 async def new_user(new_user : UserCreateSchema, db : AsyncSession = Depends(get_async_db)) -> UserSchema:
     request_user = await db.scalar(select(UserModel).where(UserModel.email == new_user.email))
@@ -78,37 +146,36 @@ async def get_users(
     last_id : int | None = None,
     current_user : UserModel = Depends(jwt_manager.get_current_user)
 ) -> list[UserDetailSchema]:
+    """
+    Активные пользователи, новые первыми. Курсор - id последнего пользователя страницы,
+    страница продолжается по (created_at, id), счетчики решений хранятся в users
+    """
     filters = [UserModel.is_active == True]
     if last_id is not None:
-        filters.append(UserModel.id > last_id)
-    request_user = await db.execute(
-        select(
-            UserModel,
-            func.count(DecisionModel.id).filter(DecisionModel.is_active.is_(True), DecisionModel.status == "ready").label("decisions_taken"),
-            func.count(DecisionModel.id).filter(DecisionModel.is_active.is_(True), DecisionModel.status == "in_processing").label("unaccepted_decisions")
- 
-        )
+        last_created_at = await db.scalar(select(UserModel.created_at).where(UserModel.id == last_id))
+        if last_created_at is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный курсор")
+        filters.append(tuple_(UserModel.created_at, UserModel.id) < tuple_(last_created_at, last_id))
+    request_user = await db.scalars(
+        select(UserModel)
         .where(*filters)
-        .outerjoin(UserModel.decisions)
-        .group_by(UserModel.id)
-        .order_by(UserModel.created_at.desc())
+        .order_by(UserModel.created_at.desc(), UserModel.id.desc())
         .limit(30)
     )
-    results = request_user.all()
-    return [
-        UserDetailSchema(
-            id = user.id,
-            name=user.name,
-            email=user.email,
-            role=user.role,
-            created_at=user.created_at,
-            is_active = user.is_active,
-            decisions_taken = decisions_taken,
-            unaccepted_decisions = unaccepted_decisions
-        )
-         
-        for user,decisions_taken,unaccepted_decisions in results
-    ]
+    return json_response(USER_LIST, request_user.all())
+
+
+@router.get("/leaderboard", response_model=LeaderboardSchema)
+async def get_users_leaderboard(
+    window : Literal["7d", "30d", "all"] = "7d",
+    db : AsyncSession = Depends(get_async_db),
+    current_user : UserModel = Depends(jwt_manager.get_current_user)
+) -> LeaderboardSchema:
+    """
+    Топ пользователей по принятым решениям за 7 дней, 30 дней или за все время.
+    Отдается снимок, который периодически пересчитывает celery
+    """
+    return await get_leaderboard(db, window)
 
 
 @router.put("/change-password", status_code=200)
@@ -204,14 +271,9 @@ async def deactivate_user(
     
     
     
-    await db.execute(
-        update(UserModel)
-        .where(UserModel.id == user_id)
-        .values(is_active=False)
-    )
-    await db.commit()
+    job = await deactivate(db, user_id)
     
-    return {"status": "success", "message": f"Пользователь {target_user.name} деактивирован"}
+    return {"status": "success", "message": f"Пользователь {target_user.name} деактивирован", "job_id": job.id}
 
 
 @router.delete("/account/self", status_code=200)
@@ -222,20 +284,36 @@ async def deactivate_own_account(
     if not current_user.is_active:
         raise HTTPException(400, "Аккаунт уже неактивен")
     
-    await db.execute(
-        update(UserModel)
-        .where(UserModel.id == current_user.id)
-        .values(is_active=False)
-    )
-    await db.commit()
+    job = await deactivate(db, current_user.id)
     
     return {
         "status": "success",
         "message": "✅ Аккаунт деактивирован.",
-        "action": "logout"
+        "action": "logout",
+        "job_id": job.id
     }
 
 
+@router.get("/{user_id}/jobs", response_model=list[UserJobSchema])
+async def get_user_jobs(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserModel = Depends(jwt_manager.get_current_user)
+) -> list[UserJobSchema]:
+    """
+    Прогресс фоновых задач по пользователю, новые первыми
+    """
+    if current_user.role == "user":
+        raise HTTPException(403, "Только для админов")
+    result = await db.scalars(
+        select(UserJobModel)
+        .where(UserJobModel.user_id == user_id)
+        .order_by(UserJobModel.id.desc())
+        .limit(20)
+    )
+    return json_response(USER_JOB_LIST, result.all())
+
+
 
 @router.put("/{user_id}/role")
 async def update_user_role(
@@ -277,6 +355,8 @@ async def hard_delete_user(
         select(UserModel)
         .where(UserModel.id == user_id, UserModel.is_active == False)
     )
+    if target_user is None:
+        target_user = await db.get(UserArchiveModel, user_id)
     
     if not target_user:
         raise HTTPException(404, "Пользователь не найден")
@@ -293,8 +373,15 @@ async def hard_delete_user(
     if target_user.id == current_user.id:
         raise HTTPException(403, "Нельзя удалить себя!")
     
-    await db.delete(target_user)
-    await db.commit()
+    if isinstance(target_user, UserArchiveModel):
+        image_urls = await db.run_sync(delete_archived_user, user_id)
+        await db.commit()
+        await release_images(db, image_urls)
+        return {"status": "deleted", "message": "Пользователь удалён"}
+    
+    response = await purge(db, target_user.id)
+    if response is not None:
+        return response
     
     return {"status": "deleted", "message": "Пользователь удалён"}
 
@@ -307,8 +394,9 @@ async def hard_delete_own_account(
     if current_user.is_active == True:
         raise HTTPException(400, "Ошибка, аккаунт еще действует")
     
-    await db.delete(current_user)
-    await db.commit()
+    response = await purge(db, current_user.id)
+    if response is not None:
+        return response
     
     return {"status": "deleted", "message": "Собственный аккаунт удалён"}
 
@@ -24,6 +24,7 @@ class CommentSchema(BaseModel):
     status : bool
     like : int = Field(default=0,ge=0,  description="Колличество лайков")
     dislike : int = Field(default=0,ge=0,  description="Колличество дизлайков")
+    my_vote : Optional[bool] = Field(default=None, description="Голос текущего пользователя: True лайк, False дизлайк, None нет голоса")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -1,7 +1,7 @@
-from pydantic import BaseModel, Field, PositiveInt, ConfigDict
+from pydantic import BaseModel, Field, PositiveInt, ConfigDict, computed_field
 from fastapi import Form
 
-from typing import Optional, Annotated
+from typing import Optional, Annotated, Literal
 from datetime import datetime
 
 from app.schemas.decision_history import DecisionHistorySchema
@@ -27,6 +27,7 @@ class DecisionSchema(BaseModel):
     title : str
     description : Optional[str]
     image_url : Optional[str]
+    image_variants : Optional[dict] = Field(default=None, exclude=True)
     user_id : PositiveInt
     created_at : datetime
     updated_at : datetime
@@ -34,9 +35,21 @@ class DecisionSchema(BaseModel):
     is_active : bool
     like : int = Field(default=0, ge=0, description="Количество лайков")
     dislike : int = Field(default=0,ge=0,  description="Количество дизлайков")
+    my_vote : Optional[bool] = Field(default=None, description="Голос текущего пользователя: True лайк, False дизлайк, None нет голоса")
 
     model_config = ConfigDict(from_attributes=True)
 
+    @computed_field(description="srcset уменьшенных копий по форматам, None пока копии не готовы")
+    @property
+    def srcset(self) -> Optional[dict[str, str]]:
+        if not self.image_variants or self.image_variants.get("source") != self.image_url:
+            return None
+        sizes = [value for key, value in self.image_variants.items() if key != "source"]
+        return {
+            fmt: ", ".join(f"{size[fmt]} {size['width']}w" for size in sizes)
+            for fmt in ("webp", "jpeg")
+        }
+
 
 
 class DecisionSearchSchema(BaseModel):
@@ -49,6 +62,12 @@ class DecisionSearchSchema(BaseModel):
     model_config = ConfigDict(from_attributes=True)
  
 
+class DecisionBatchItemSchema(BaseModel):
+    id : PositiveInt
+    found : bool = Field(..., description="False если решения нет или оно скрыто")
+    decision : Optional[DecisionSchema] = None
+
+
 class DecisionUpdateSchema(DecisionCreateSchema):
     pass
 
@@ -56,4 +75,26 @@ class DecisionDetailSchema(DecisionSchema):
     decision_history : list[DecisionHistorySchema] = Field(default_factory=list, description="История обновления решения")
 
 
-    
\ No newline at end of file
+class ImageUploadRequestSchema(BaseModel):
+    sha256 : str = Field(..., pattern=r"^[0-9a-f]{64}$", description="sha256 содержимого файла в hex")
+    size : int = Field(..., ge=1, le=2 * 1024 * 1024, description="Размер файла в байтах, не больше 2 МБ")
+    content_type : Literal["image/png", "image/jpeg"]
+
+
+class ImageUploadSchema(BaseModel):
+    image_key : str = Field(..., description="Ключ картинки, передается в image_key при создании/обновлении решения")
+    upload : Optional[dict] = Field(None, description="Запрос для загрузки в хранилище, None если файл уже загружен")
+
+
+class VoteHourSchema(BaseModel):
+    hour : datetime
+    likes : int
+    dislikes : int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class VoteTimelineSchema(BaseModel):
+    decision_id : PositiveInt
+    since : datetime = Field(..., description="Начало периода, часы без голосов в points не попадают")
+    points : list[VoteHourSchema] = Field(default_factory=list)
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+
+
+class DecisionStatsSchema(BaseModel):
+    decision_id : int
+    user_id : int
+    status : str
+    created_at : datetime
+    likes : int
+    dislikes : int
+    comments : int
+    history_count : int
+    refreshed_at : datetime | None #None до первого обновления задачей
+
+    model_config = ConfigDict(from_attributes=True)
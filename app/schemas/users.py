@@ -1,5 +1,6 @@
 from pydantic import Field, field_validator, EmailStr, BaseModel, PositiveInt, ConfigDict
 from datetime import datetime
+from typing import Literal
 
 
 
@@ -66,10 +67,43 @@ class ChangeEmailSchema(BaseModel):
     new_email : EmailStr
 
 
+class UserJobSchema(BaseModel):
+    id : PositiveInt
+    user_id : PositiveInt
+    kind : str
+    status : str = Field(..., description="pending | running | done | failed")
+    stage : str = Field(..., description="Текущий этап задачи")
+    batch_size : int
+    decisions_done : int = Field(0, ge=0, description="Обработано решений")
+    votes_done : int = Field(0, ge=0, description="Удалено голосов")
+    history_done : int = Field(0, ge=0, description="Обработано историй")
+    comments_done : int = Field(0, ge=0, description="Обработано комментариев")
+    error : str | None = None
+    created_at : datetime
+    updated_at : datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class RoleUpdateSchema(BaseModel):
     role: str = Field(
         ...,
         pattern=r"^(user|admin)$",  
         description="Доступные роли: user, admin",
         examples=["user", "admin"]
-    )
\ No newline at end of file
+    )
+
+
+class LeaderboardEntrySchema(BaseModel):
+    rank : PositiveInt
+    user_id : PositiveInt
+    name : str
+    accepted : int = Field(..., ge=0, description="Принятых решений за окно")
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class LeaderboardSchema(BaseModel):
+    window : Literal["7d", "30d", "all"]
+    computed_at : datetime | None = Field(None, description="Когда снят снимок, None если еще не считался")
+    items : list[LeaderboardEntrySchema] = Field(default_factory=list)
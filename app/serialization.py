@@ -0,0 +1,105 @@
+from fastapi import Response, HTTPException, status
+from pydantic import TypeAdapter
+
+from app.schemas.decisions import DecisionSchema, DecisionSearchSchema, DecisionBatchItemSchema
+from app.schemas.comments import CommentSchema
+from app.schemas.users import UserDetailSchema, UserJobSchema
+from app.schemas.stats import DecisionStatsSchema
+
+
+# Валидаторы и сериализаторы собираются один раз при импорте, а не на каждый запрос
+DECISION_LIST = TypeAdapter(list[DecisionSchema])
+DECISION_PAGE = TypeAdapter(DecisionSearchSchema)
+DECISION_BATCH = TypeAdapter(list[DecisionBatchItemSchema])
+COMMENT_LIST = TypeAdapter(list[CommentSchema])
+USER_LIST = TypeAdapter(list[UserDetailSchema])
+USER_JOB_LIST = TypeAdapter(list[UserJobSchema])
+DECISION_STATS_LIST = TypeAdapter(list[DecisionStatsSchema])
+
+
+# поля карточки решения, которые можно запросить в fields=
+DECISION_FIELDS = frozenset(
+    name for name, field in DecisionSchema.model_fields.items() if not field.exclude
+) | frozenset(DecisionSchema.model_computed_fields)
+# тяжелые колонки: не запрошено поле ответа - колонку не читаем
+DEFERRABLE_COLUMNS = {"description": "description", "srcset": "image_variants"}
+
+
+def json_response(adapter: TypeAdapter, content, headers: dict | None = None, include=None) -> Response:
+    """
+    Быстрый ответ для списков: content (словари, строки или ORM объекты) проверяется один раз
+    и сразу пишется в байты сериализатором pydantic-core. Готовый Response FastAPI
+    не прогоняет повторно через response_model, который остается только для документации
+    """
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True), include=include)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def parse_fields(fields: str | None) -> frozenset[str] | None:
+    """
+    fields=id,title,like -> набор полей карточки, None - все поля. id отдается всегда
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - DECISION_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неизвестные поля: {', '.join(sorted(unknown))}",
+        )
+    return frozenset(requested | {"id"})
+
+
+def deferred_columns(fields: frozenset[str] | None) -> list[str]:
+    """
+    Колонки DecisionModel, которые не нужны для ответа с такими fields
+    """
+    if fields is None:
+        return []
+    return [column for name, column in DEFERRABLE_COLUMNS.items() if name not in fields]
+
+
+def items_include(fields: frozenset[str] | None):
+    """
+    include для dump_json списка карточек
+    """
+    return None if fields is None else {"__all__": set(fields)}
+
+
+def decision_item(
+    decision, like: int, dislike: int, my_vote: bool | None = None, fields: frozenset[str] | None = None
+) -> dict:
+    # отложенные колонки не трогаем: в async сессии обращение к ним - ленивая загрузка и ошибка
+    skipped = deferred_columns(fields)
+    return {
+        "id": decision.id,
+        "title": decision.title,
+        "description": None if "description" in skipped else decision.description,
+        "image_url": decision.image_url,
+        "image_variants": None if "image_variants" in skipped else decision.image_variants,
+        "user_id": decision.user_id,
+        "created_at": decision.created_at,
+        "updated_at": decision.updated_at,
+        "status": decision.status,
+        "is_active": decision.is_active,
+        "like": like,
+        "dislike": dislike,
+        "my_vote": my_vote,
+    }
+
+
+def comment_item(comment, like: int, dislike: int, my_vote: bool | None = None) -> dict:
+    return {
+        "id": comment.id,
+        "text": comment.text,
+        "decision_id": comment.decision_id,
+        "user_id": comment.user_id,
+        "parent_id": comment.parent_id,
+        "created_at": comment.created_at,
+        "updated_at": comment.updated_at,
+        "status": comment.status,
+        "like": like,
+        "dislike": dislike,
+        "my_vote": my_vote,
+    }
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+FLIGHTS: dict[str, "SingleFlight"] = {} #по имени, для /stats/single-flight
+
+
+class SingleFlight:
+    """
+    Одновременные одинаковые чтения (одинаковый key) ждут одну общую загрузку.
+    Загрузка идет отдельной задачей в своей сессии: отмена запроса, который ее начал,
+    не отменяет ее для остальных. Результат не кешируется - следующий запрос после
+    завершения начнет новую загрузку. Перед do запрос должен отпустить свое соединение
+    (commit), иначе под нагрузкой все соединения пула заняты запросами, ждущими загрузок
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tasks: dict[tuple, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0 #вызовы, которые дождались чужой загрузки
+        FLIGHTS[name] = self
+
+    async def do(self, key: tuple, load):
+        """
+        load - функция без аргументов, возвращающая корутину. Результат общий
+        для всех ожидающих, менять его нельзя
+        """
+        self.calls += 1
+        task = self.tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(load())
+            self.tasks[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: tuple, task: asyncio.Task) -> None:
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        if not task.cancelled() and task.exception() is not None:
+            # исключение получат ожидающие, здесь только чтобы не терялось при отмене всех
+            logger.debug("Загрузка %s %s завершилась ошибкой", self.name, key, exc_info=task.exception())
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "in_flight": len(self.tasks),
+            "ratio": round(self.shared / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+def single_flight_stats() -> dict[str, dict]:
+    return {name: flight.stats() for name, flight in FLIGHTS.items()}
@@ -0,0 +1,255 @@
+import os
+import time
+import asyncio
+import tempfile
+
+from os import getenv
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from pathlib import Path
+
+
+load_dotenv()
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+MEDIA_ROOT = BASE_DIR / "media" / "decisions"
+MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
+MEDIA_URL = "/media/decisions"
+
+
+class LocalStorage:
+    """
+    Файлы лежат в MEDIA_ROOT на этом же сервере и раздаются через /media
+    """
+
+    def __init__(self, root: Path, base_url: str):
+        self.root = root
+        self.base_url = base_url
+        self.staging_dir = root #временный файл в той же папке, чтобы os.replace был атомарным
+
+    def url_for_key(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def key_for_url(self, url: str) -> str | None:
+        prefix = self.base_url + "/"
+        if not url or not url.startswith(prefix):
+            return None
+        path = (self.root / url[len(prefix):]).resolve()
+        if not path.is_relative_to(self.root):
+            return None
+        return path.relative_to(self.root).as_posix()
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def _put(self, key: str, tmp_name: str) -> None:
+        target = self.path(key)
+        if target.exists():
+            # такой файл уже есть: копию выкидываем, оригиналу продлеваем жизнь
+            os.unlink(tmp_name)
+            os.utime(target)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, target)
+
+    async def put_file(self, key: str, tmp_name: str, content_type: str) -> None:
+        """
+        Забирает временный файл под ключ key
+        """
+        await run_in_threadpool(self._put, key, tmp_name)
+
+    def _stat(self, key: str) -> tuple[int, float] | None:
+        try:
+            stat_result = self.path(key).stat()
+        except FileNotFoundError:
+            return None
+        return stat_result.st_size, stat_result.st_mtime
+
+    async def stat(self, key: str) -> tuple[int, float] | None:
+        """
+        (размер, время изменения) или None если файла нет
+        """
+        return await run_in_threadpool(self._stat, key)
+
+    async def touch(self, key: str, content_type: str) -> None:
+        """
+        Обновляет время изменения файла: освобождение не удалит его в ближайшие RELEASE_GRACE_SECONDS
+        """
+        await run_in_threadpool(os.utime, self.path(key))
+
+    def _read_head(self, key: str, size: int) -> bytes:
+        with open(self.path(key), "rb") as file:
+            return file.read(size)
+
+    async def read_head(self, key: str, size: int) -> bytes:
+        """
+        Первые size байт файла
+        """
+        return await run_in_threadpool(self._read_head, key, size)
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.path(key).unlink, True)
+
+    async def presign_upload(self, key: str, content_type: str, size: int, checksum: str) -> dict | None:
+        """
+        None: прямой загрузки нет, файл отправляется формой
+        """
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class S3Storage:
+    """
+    S3-совместимое хранилище (AWS S3, MinIO). Нужен пакет aiobotocore, см. requirements-s3.txt
+    """
+
+    def __init__(self, bucket: str, public_url: str, endpoint_url: str | None = None,
+                 region: str | None = None, access_key: str | None = None, secret_key: str | None = None):
+        try:
+            from aiobotocore.session import get_session
+            from aiobotocore.config import AioConfig
+        except ImportError:
+            raise RuntimeError("Для STORAGE_BACKEND=s3 установите aiobotocore")
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.staging_dir = tempfile.gettempdir()
+        self._session = get_session()
+        self._client_options = {
+            "endpoint_url": endpoint_url,
+            "region_name": region,
+            "aws_access_key_id": access_key,
+            "aws_secret_access_key": secret_key,
+            # SigV4: в подпись presigned запроса входят тип, размер и checksum
+            "config": AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+        }
+        self._client_context = None
+        self._client = None
+        self._client_lock = asyncio.Lock()
+
+    async def client(self):
+        # один клиент (и пул соединений) на процесс
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    self._client_context = self._session.create_client("s3", **self._client_options)
+                    self._client = await self._client_context.__aenter__()
+        return self._client
+
+    async def close(self) -> None:
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client_context = None
+            self._client = None
+
+    def url_for_key(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def key_for_url(self, url: str) -> str | None:
+        prefix = self.public_url + "/"
+        if not url or not url.startswith(prefix):
+            return None
+        return url[len(prefix):]
+
+    async def stat(self, key: str) -> tuple[int, float] | None:
+        from botocore.exceptions import ClientError
+        client = await self.client()
+        try:
+            head = await client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head["ContentLength"], head["LastModified"].timestamp()
+
+    async def put_file(self, key: str, tmp_name: str, content_type: str) -> None:
+        """
+        Загружает временный файл под ключ key и удаляет его. Картинки не больше MAX_SIZE,
+        поэтому хватает одного put_object
+        """
+        try:
+            if await self.stat(key) is not None:
+                # такой объект уже есть: продлеваем ему жизнь, как os.utime в LocalStorage
+                await self.touch(key, content_type)
+                return
+            body = await run_in_threadpool(Path(tmp_name).read_bytes)
+            client = await self.client()
+            await client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+        finally:
+            await run_in_threadpool(Path(tmp_name).unlink, True)
+
+    async def touch(self, key: str, content_type: str) -> None:
+        """
+        Копия объекта на себя же обновляет LastModified. Без REPLACE S3 такую копию не принимает
+        """
+        client = await self.client()
+        await client.copy_object(
+            Bucket=self.bucket,
+            Key=key,
+            CopySource={"Bucket": self.bucket, "Key": key},
+            MetadataDirective="REPLACE",
+            ContentType=content_type,
+        )
+
+    async def read_head(self, key: str, size: int) -> bytes:
+        """
+        Первые size байт объекта ranged GET-запросом
+        """
+        client = await self.client()
+        response = await client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes=0-{size - 1}")
+        async with response["Body"] as body:
+            return await body.read()
+
+    async def delete(self, key: str) -> None:
+        client = await self.client()
+        await client.delete_object(Bucket=self.bucket, Key=key)
+
+    async def presign_upload(self, key: str, content_type: str, size: int, checksum: str) -> dict:
+        """
+        Подписанный PUT прямо в хранилище. Тип, размер и sha256 входят в подпись,
+        поэтому клиент не может залить под этим ключом другой файл
+        """
+        client = await self.client()
+        expires = 15 * 60
+        url = await client.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": checksum,
+            },
+            ExpiresIn=expires,
+        )
+        return {
+            "method": "PUT",
+            "url": url,
+            "headers": {
+                "Content-Type": content_type,
+                "Content-Length": str(size),
+                "x-amz-checksum-sha256": checksum,
+            },
+            "expires_at": int(time.time()) + expires,
+        }
+
+
+def create_storage():
+    backend = getenv("STORAGE_BACKEND", "local")
+    if backend == "local":
+        return LocalStorage(MEDIA_ROOT, MEDIA_URL)
+    if backend == "s3":
+        return S3Storage(
+            bucket=getenv("S3_BUCKET"),
+            public_url=getenv("S3_PUBLIC_URL"),
+            endpoint_url=getenv("S3_ENDPOINT_URL"), #для MinIO, например http://127.0.0.1:9000
+            region=getenv("S3_REGION"),
+            access_key=getenv("S3_ACCESS_KEY"),
+            secret_key=getenv("S3_SECRET_KEY"),
+        )
+    raise RuntimeError(f"Неизвестный STORAGE_BACKEND: {backend}")
+
+
+storage = create_storage()
@@ -0,0 +1,247 @@
+import math
+import logging
+
+from os import getenv
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import select, func, update, case
+
+from app.models import DecisionModel, DecisionVoteModel
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# hot = sign(n) * log10(max(|n|, 1)) + (created_at - HOT_EPOCH) / HOT_DECAY_SECONDS, n = лайки - дизлайки.
+# Каждые HOT_DECAY_SECONDS новое решение стоит в 10 раз больше голосов, чем старое.
+# Счет не растет со временем, поэтому не переполняется и пересчитывается из базы
+HOT_EPOCH = 1767225600 #2026-01-01 UTC
+HOT_DECAY_SECONDS = 45000
+TRENDING_SIZE = int(getenv("TRENDING_SIZE", "1000")) #сколько лучших решений держим в индексе
+
+
+def hot_score(net_votes: int, created_at: datetime) -> float:
+    sign = (net_votes > 0) - (net_votes < 0)
+    return sign * math.log10(max(abs(net_votes), 1)) + (created_at.timestamp() - HOT_EPOCH) / HOT_DECAY_SECONDS
+
+
+def hot_score_sql(net_votes, created_at):
+    """
+    То же, что hot_score, выражением для UPDATE
+    """
+    return (
+        func.sign(net_votes) * func.log(func.greatest(func.abs(net_votes), 1))
+        + (func.extract("epoch", created_at) - HOT_EPOCH) / HOT_DECAY_SECONDS
+    )
+
+
+def recount_scores(db, decision_ids=None) -> dict[int, float]:
+    """
+    Пересчитывает net_votes и hot_score из голосов (синхронная сессия): всех решений или только decision_ids.
+    Для decision_ids возвращает новые hot_score активных решений, чтобы после commit обновить индекс
+    """
+    net_votes = (
+        select(func.coalesce(func.sum(case((DecisionVoteModel.is_like, 1), else_=-1)), 0))
+        .where(DecisionVoteModel.decision_id == DecisionModel.id)
+        .scalar_subquery()
+    )
+    stmt = update(DecisionModel).values(
+        net_votes=net_votes,
+        hot_score=hot_score_sql(net_votes, DecisionModel.created_at),
+        updated_at=DecisionModel.updated_at,
+    )
+    if decision_ids is None:
+        db.execute(stmt)
+        return {}
+    rows = db.execute(
+        stmt
+        .where(DecisionModel.id.in_(decision_ids))
+        .returning(DecisionModel.id, DecisionModel.hot_score, DecisionModel.is_active)
+    )
+    return {decision_id: score for decision_id, score, is_active in rows if is_active}
+
+
+class MemoryTrending:
+    """
+    Индекс в памяти процесса, для тестов и запуска без Redis
+    """
+
+    def __init__(self, size: int = TRENDING_SIZE):
+        self.size = size
+        self.scores: dict[int, float] = {}
+
+    async def set_score(self, decision_id: int, score: float) -> None:
+        self.scores[decision_id] = score
+        if len(self.scores) > self.size * 2:
+            self.scores = dict(sorted(self.scores.items(), key=lambda item: item[1], reverse=True)[:self.size])
+
+    async def remove(self, decision_id: int) -> None:
+        self.scores.pop(decision_id, None)
+
+    async def top(self, offset: int, limit: int) -> list[int]:
+        ranked = sorted(self.scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+        return [decision_id for decision_id, _ in ranked[offset:offset + limit]]
+
+    async def count(self) -> int:
+        return len(self.scores)
+
+    async def replace(self, scores: dict[int, float]) -> None:
+        self.scores = dict(scores)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisTrending:
+    """
+    Сортированное множество Redis: обновление и чтение страницы за O(log n)
+    """
+    key = "decisions:trending"
+
+    def __init__(self, url: str, size: int = TRENDING_SIZE):
+        import redis.asyncio
+        self.url = url
+        self.redis = redis.asyncio.from_url(url)
+        self.sync_redis = None #для задач Celery, создается при первом вызове
+        self.size = size
+
+    async def set_score(self, decision_id: int, score: float) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self.key, {decision_id: score})
+            pipe.zremrangebyrank(self.key, 0, -self.size - 1) #хвост за пределами TRENDING_SIZE выкидываем
+            await pipe.execute()
+
+    def _sync_client(self):
+        if self.sync_redis is None:
+            import redis
+            self.sync_redis = redis.Redis.from_url(self.url)
+        return self.sync_redis
+
+    def set_scores_sync(self, scores: dict[int, float]) -> None:
+        with self._sync_client().pipeline(transaction=False) as pipe:
+            pipe.zadd(self.key, scores)
+            pipe.zremrangebyrank(self.key, 0, -self.size - 1)
+            pipe.execute()
+
+    def replace_sync(self, scores: dict[int, float]) -> None:
+        with self._sync_client().pipeline(transaction=True) as pipe:
+            pipe.delete(self.key)
+            if scores:
+                pipe.zadd(self.key, scores)
+            pipe.execute()
+
+    async def remove(self, decision_id: int) -> None:
+        await self.redis.zrem(self.key, decision_id)
+
+    async def top(self, offset: int, limit: int) -> list[int]:
+        members = await self.redis.zrevrange(self.key, offset, offset + limit - 1)
+        return [int(member) for member in members]
+
+    async def count(self) -> int:
+        return await self.redis.zcard(self.key)
+
+    async def replace(self, scores: dict[int, float]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key)
+            if scores:
+                pipe.zadd(self.key, scores)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_trending():
+    backend = getenv("TRENDING_BACKEND", "redis")
+    if backend == "memory":
+        return MemoryTrending()
+    if backend == "redis":
+        return RedisTrending(getenv("REDIS_URL", "redis://127.0.0.1:6379/0"))
+    raise RuntimeError(f"Неизвестный TRENDING_BACKEND: {backend}")
+
+
+trending = create_trending()
+
+
+async def update_score(decision_id: int, score: float | None) -> None:
+    """
+    Индекс - кеш над decisions.hot_score: ошибка Redis не должна ломать голосование
+    """
+    if score is None:
+        return
+    try:
+        await trending.set_score(decision_id, score)
+    except Exception:
+        logger.exception("Не удалось обновить trending для решения %s", decision_id)
+
+
+def update_scores_sync(scores: dict[int, float]) -> None:
+    """
+    update_score для синхронного кода задач Celery. Индекс в памяти у каждого процесса свой,
+    из воркера его не обновить - поправится при перезапуске приложения
+    """
+    if not scores or not isinstance(trending, RedisTrending):
+        return
+    try:
+        trending.set_scores_sync(scores)
+    except Exception:
+        logger.exception("Не удалось обновить trending для решений %s", sorted(scores))
+
+
+def replace_scores_sync(db) -> None:
+    """
+    Заново заполняет индекс из decisions.hot_score после полного пересчета (синхронная сессия)
+    """
+    if not isinstance(trending, RedisTrending):
+        return
+    try:
+        rows = db.execute(
+            select(DecisionModel.id, DecisionModel.hot_score)
+            .where(DecisionModel.is_active.is_(True))
+            .order_by(DecisionModel.hot_score.desc())
+            .limit(TRENDING_SIZE)
+        )
+        trending.replace_sync({decision_id: score for decision_id, score in rows})
+    except Exception:
+        logger.exception("Не удалось заполнить trending")
+
+
+async def remove_score(decision_id: int) -> None:
+    try:
+        await trending.remove(decision_id)
+    except Exception:
+        logger.exception("Не удалось убрать решение %s из trending", decision_id)
+
+
+async def trending_ids(offset: int, limit: int) -> list[int] | None:
+    """
+    id решений страницы по убыванию hot_score, None если индекс недоступен
+    или страница за пределами TRENDING_SIZE - тогда читаем из базы
+    """
+    if offset + limit > TRENDING_SIZE:
+        return None
+    try:
+        return await trending.top(offset, limit)
+    except Exception:
+        logger.exception("Индекс trending недоступен")
+        return None
+
+
+async def rebuild_trending(db) -> None:
+    """
+    Заполняет индекс из decisions.hot_score, если он пуст (Redis очищен, процесс перезапущен)
+    """
+    try:
+        if await trending.count():
+            return
+        rows = await db.execute(
+            select(DecisionModel.id, DecisionModel.hot_score)
+            .where(DecisionModel.is_active.is_(True))
+            .order_by(DecisionModel.hot_score.desc())
+            .limit(TRENDING_SIZE)
+        )
+        await trending.replace({decision_id: score for decision_id, score in rows})
+    except Exception:
+        logger.exception("Не удалось заполнить trending")
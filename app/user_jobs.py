@@ -0,0 +1,255 @@
+from collections import Counter
+
+from celery import shared_task
+from sqlalchemy import select, update, delete, func, union, tuple_
+
+from app.database import SyncSessionLocal
+from app.archive import delete_archived_user, rescore_decisions, rescored_scores
+from app.media import release_images_sync
+from app.trending import update_scores_sync
+from app.utilits import decision_counters
+from app.etag import bump_version
+from app.models import (
+    UserModel, DecisionModel, DecisionHistoryModel, DecisionVoteModel,
+    CommentModel, CommentVoteModel, DecisionVoteHourModel, UserJobModel
+)
+
+
+BATCH_SIZE = 500
+# больше строк - удаляем пользователя фоновой задачей, а не в запросе
+PURGE_INLINE_LIMIT = 2000
+DEACTIVATION_STAGES = ("decisions", "decision_history", "comments", "done")
+# архив первым: его строки ищутся в том числе по горячим решениям пользователя
+PURGE_STAGES = (
+    "archive", "comment_votes", "votes", "comments",
+    "decision_comment_votes", "decision_votes", "decision_comments", "decision_history", "decision_vote_hours",
+    "decisions", "user", "done",
+)
+RELEASED = "released_image_urls" #ключ db.info: картинки удаленных строк, освобождаются после commit
+
+PROGRESS_FIELDS = {
+    "decisions": "decisions_done",
+    "decision_history": "history_done",
+    "comments": "comments_done",
+    "comment_votes": "votes_done",
+    "votes": "votes_done",
+    "decision_comment_votes": "votes_done",
+    "decision_votes": "votes_done",
+    "decision_comments": "comments_done",
+}
+
+
+def _deactivation_batch(db, stage: str, user_id: int, batch_size: int) -> int:
+    """
+    Скрывает одну пачку записей пользователя, возвращает количество затронутых строк.
+    Повторный запуск безопасен: берутся только еще активные записи
+    """
+    if stage == "decisions":
+        ids = (
+            select(DecisionModel.id)
+            .where(DecisionModel.user_id == user_id, DecisionModel.is_active.is_(True))
+            .limit(batch_size)
+        )
+        statuses = db.scalars(
+            update(DecisionModel)
+            .where(DecisionModel.id.in_(ids))
+            .values(is_active=False, deleted_at=func.now())
+            .returning(DecisionModel.status)
+        ).all()
+        if statuses:
+            db.execute(decision_counters(user_id, **{
+                decision_status: -count for decision_status, count in Counter(statuses).items()
+            }))
+        return len(statuses)
+    elif stage == "decision_history":
+        ids = (
+            select(DecisionHistoryModel.id)
+            .join(DecisionModel, DecisionModel.id == DecisionHistoryModel.decision_id)
+            .where(DecisionModel.user_id == user_id, DecisionHistoryModel.is_active.is_(True))
+            .limit(batch_size)
+        )
+        stmt = update(DecisionHistoryModel).where(DecisionHistoryModel.id.in_(ids)).values(is_active=False, deleted_at=func.now())
+    else:
+        ids = (
+            select(CommentModel.id)
+            .where(CommentModel.user_id == user_id, CommentModel.status.is_(True))
+            .limit(batch_size)
+        )
+        decision_ids = db.scalars(
+            update(CommentModel)
+            .where(CommentModel.id.in_(ids))
+            .values(status=False, deleted_at=func.now())
+            .returning(CommentModel.decision_id)
+        ).all()
+        if decision_ids:
+            db.execute(bump_version(set(decision_ids)))
+        return len(decision_ids)
+    return db.execute(stmt).rowcount
+
+
+PURGE_MODELS = {
+    "comment_votes": CommentVoteModel,
+    "votes": DecisionVoteModel,
+    "comments": CommentModel,
+    "decisions": DecisionModel,
+}
+
+# решения, чей ответ меняет удаление пачки: сдвигаем им version, см. app.etag
+PURGE_TOUCHED = {
+    "comment_votes": lambda ids: (
+        select(CommentModel.decision_id)
+        .join(CommentVoteModel, CommentVoteModel.comment_id == CommentModel.id)
+        .where(CommentVoteModel.id.in_(ids))
+    ),
+    "votes": lambda ids: select(DecisionVoteModel.decision_id).where(DecisionVoteModel.id.in_(ids)),
+    "comments": lambda ids: select(CommentModel.decision_id).where(CommentModel.id.in_(ids)),
+}
+
+
+def _owned(column, user_id: int):
+    return column.in_(select(DecisionModel.id).where(DecisionModel.user_id == user_id))
+
+
+# строки под решениями пользователя, в том числе чужие: (модель, ключ строки, запрос ключей).
+# Удаляются своими пачками до решений, иначе ON DELETE CASCADE унесет их все одной пачкой решений
+DECISION_DEPENDENTS = {
+    "decision_comment_votes": lambda user_id: (
+        CommentVoteModel,
+        CommentVoteModel.id,
+        select(CommentVoteModel.id)
+        .join(CommentModel, CommentModel.id == CommentVoteModel.comment_id)
+        .where(_owned(CommentModel.decision_id, user_id)),
+    ),
+    "decision_votes": lambda user_id: (
+        DecisionVoteModel,
+        DecisionVoteModel.id,
+        select(DecisionVoteModel.id).where(_owned(DecisionVoteModel.decision_id, user_id)),
+    ),
+    # ответы новее родителей: с конца удаляем ответы раньше, чем каскад дойдет до них от родителя
+    "decision_comments": lambda user_id: (
+        CommentModel,
+        CommentModel.id,
+        select(CommentModel.id).where(_owned(CommentModel.decision_id, user_id)).order_by(CommentModel.id.desc()),
+    ),
+    "decision_history": lambda user_id: (
+        DecisionHistoryModel,
+        DecisionHistoryModel.id,
+        select(DecisionHistoryModel.id).where(_owned(DecisionHistoryModel.decision_id, user_id)),
+    ),
+    "decision_vote_hours": lambda user_id: (
+        DecisionVoteHourModel,
+        tuple_(DecisionVoteHourModel.decision_id, DecisionVoteHourModel.hour),
+        select(DecisionVoteHourModel.decision_id, DecisionVoteHourModel.hour)
+        .where(_owned(DecisionVoteHourModel.decision_id, user_id)),
+    ),
+}
+
+
+def _purge_batch(db, stage: str, user_id: int, batch_size: int) -> int:
+    """
+    Удаляет одну пачку строк пользователя обычным DELETE.
+    Архивные копии удаляются первым этапом, пока горячие решения пользователя еще на месте,
+    строки под решениями - до самих решений, так что на ON DELETE CASCADE остаются только ответы на комментарии
+    """
+    if stage == "user":
+        return db.execute(delete(UserModel).where(UserModel.id == user_id)).rowcount
+    if stage == "archive":
+        db.info.setdefault(RELEASED, []).extend(delete_archived_user(db, user_id))
+        return 0
+    if stage in DECISION_DEPENDENTS:
+        model, key, rows = DECISION_DEPENDENTS[stage](user_id)
+        return db.execute(delete(model).where(key.in_(rows.limit(batch_size)))).rowcount
+    model = PURGE_MODELS[stage]
+    ids = db.scalars(select(model.id).where(model.user_id == user_id).limit(batch_size)).all()
+    if not ids:
+        return 0
+    if stage in PURGE_TOUCHED:
+        db.execute(bump_version(PURGE_TOUCHED[stage](ids)))
+    if stage == "decisions":
+        db.info.setdefault(RELEASED, []).extend(db.scalars(union(
+            select(DecisionModel.image_url).where(DecisionModel.id.in_(ids)),
+            select(DecisionHistoryModel.image_url).where(DecisionHistoryModel.decision_id.in_(ids)),
+        )))
+    voted = db.scalars(PURGE_TOUCHED["votes"](ids).distinct()).all() if stage == "votes" else []
+    deleted = db.execute(delete(model).where(model.id.in_(ids))).rowcount
+    # голоса ушли мимо vote(): счет и корзины этих решений пересчитываем в той же транзакции
+    rescore_decisions(db, voted)
+    return deleted
+
+
+def purge_is_large(db, user_id: int) -> bool:
+    """
+    Много ли строк удалит удаление пользователя: его собственные и все строки под его решениями.
+    Считаем не дальше PURGE_INLINE_LIMIT в каждой таблице
+    """
+    queries = [select(model.id).where(model.user_id == user_id) for model in PURGE_MODELS.values()]
+    for dependents in DECISION_DEPENDENTS.values():
+        _, _, rows = dependents(user_id)
+        queries.append(rows.order_by(None))
+    total = 0
+    for rows in queries:
+        limited = rows.limit(PURGE_INLINE_LIMIT + 1).subquery()
+        total += db.scalar(select(func.count()).select_from(limited))
+        if total > PURGE_INLINE_LIMIT:
+            return True
+    return False
+
+
+def _run_job(task, job_id: int, stages: tuple, batch) -> bool:
+    """
+    Гоняет пачки по этапам, после каждой пачки сохраняет этап и счетчики.
+    Повторный запуск продолжает с сохраненного этапа
+    """
+    db = SyncSessionLocal()
+    try:
+        job = db.get(UserJobModel, job_id)
+        if job is None or job.status == "done":
+            return False
+        job.status = "running"
+        db.commit()
+
+        while job.stage != "done":
+            affected = batch(db, job.stage, job.user_id, job.batch_size)
+            field = PROGRESS_FIELDS.get(job.stage)
+            if field is not None:
+                setattr(job, field, getattr(job, field) + affected)
+            if affected == 0:
+                job.stage = stages[stages.index(job.stage) + 1]
+            db.commit()
+            update_scores_sync(rescored_scores(db))
+            release_images_sync(db, db.info.pop(RELEASED, []))
+
+        job.status = "done"
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        db.info.pop(RELEASED, None)
+        rescored_scores(db)
+        db.execute(
+            update(UserJobModel)
+            .where(UserJobModel.id == job_id)
+            .values(status="failed", error=str(e)[:1000])
+        )
+        db.commit()
+        raise task.retry(exc=e)
+    finally:
+        db.close()
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def cascade_user_deactivation(self, job_id: int):
+    """
+    Скрывает решения, истории и комментарии деактивированного пользователя
+    пачками по batch_size строк, каждая пачка в своей транзакции
+    """
+    return _run_job(self, job_id, DEACTIVATION_STAGES, _deactivation_batch)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def purge_user(self, job_id: int):
+    """
+    Полное удаление большого аккаунта пачками: строки в архиве, голоса, комментарии, решения,
+    затем сам пользователь. Картинки удаленных решений освобождаются после каждой пачки
+    """
+    return _run_job(self, job_id, PURGE_STAGES, _purge_batch)
@@ -1,48 +1,100 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from app.models import DecisionModel, DecisionVoteModel, UserModel, DecisionHistoryModel, CommentModel, CommentVoteModel
 from fastapi import HTTPException, status, Depends
 from app.database import SyncSessionLocal
+from app.config import vote_broadcaster
+from app.trending import hot_score_sql, update_score, recount_scores, replace_scores_sync
+from app.leaderboard import record_accepted
+from app.vote_hours import vote_hour_upsert
+from app.etag import bump_version
+from app.decision_repo import decision_with_votes_sync
 from celery import shared_task
 
 
 
 
-async def like(
+async def vote(
     user_id: int,
     decision_id: int,
+    is_like: bool,
     db: AsyncSession,
 ):
-    
-    vote = await db.scalar(
-        select(DecisionVoteModel).where(
+    """
+    Ставит, меняет или снимает голос. Возвращает is_like или None если голос снят.
+    В той же транзакции сдвигает часовую корзину голосов, net_votes и hot_score решения,
+    затем обновляет индекс trending. Строка голоса блокируется (FOR UPDATE): два одновременных
+    голоса одного пользователя идут по очереди, и каждый видит результат предыдущего
+    """
+    current_vote = (
+        select(DecisionVoteModel)
+        .where(
             DecisionVoteModel.user_id == user_id,
             DecisionVoteModel.decision_id == decision_id,
         )
+        .with_for_update()
     )
-    
+    vote = await db.scalar(current_vote)
+    while vote is None:
+        # строки еще нет, блокировать нечего: одновременную вставку разводит uq_user_decision_vote
+        inserted = await db.scalar(
+            pg_insert(DecisionVoteModel)
+            .values(user_id=user_id, decision_id=decision_id, is_like=is_like)
+            .on_conflict_do_nothing(constraint="uq_user_decision_vote")
+            .returning(DecisionVoteModel.id)
+        )
+        if inserted is not None:
+            break
+        # голос вставил и закоммитил параллельный запрос: дальше как с существующим
+        vote = await db.scalar(current_vote)
+    sign = 1 if is_like else -1
+    step = (1, 0) if is_like else (0, 1) #(лайки, дизлайки)
+
     if vote:
-        if vote.is_like:
+        voted_at = vote.created_at
+        if vote.is_like == is_like:
+            # такой же голос → убираем
             await db.delete(vote)
-            await db.commit()
-            return None  
-        else:    
-            vote.is_like = True
-            await db.commit()
-            await db.refresh(vote)
-            return True
+            result, delta = None, -sign
+            likes, dislikes = -step[0], -step[1]
+        else:
+            # противоположный → меняем
+            vote.is_like = is_like
+            result, delta = is_like, 2 * sign
+            likes, dislikes = sign, -sign
     else:
-        
-        vote = DecisionVoteModel(
-            user_id=user_id,
-            decision_id=decision_id,
-            is_like=True
+        voted_at = func.now()
+        result, delta = is_like, sign
+        likes, dislikes = step
+
+    await db.execute(vote_hour_upsert(decision_id, voted_at, likes, dislikes))
+
+    net_votes = DecisionModel.net_votes + delta
+    score = await db.scalar(
+        update(DecisionModel)
+        .where(DecisionModel.id == decision_id)
+        .values(
+            net_votes=net_votes,
+            hot_score=hot_score_sql(net_votes, DecisionModel.created_at),
+            version=DecisionModel.version + 1,
+            updated_at=DecisionModel.updated_at,
         )
-        db.add(vote)  
-        await db.commit()
-        await db.refresh(vote)
-        return True
+        .returning(DecisionModel.hot_score)
+    )
+    await db.commit()
+    vote_broadcaster.publish(decision_id)
+    await update_score(decision_id, score)
+    return result
+
+
+async def like(
+    user_id: int,
+    decision_id: int,
+    db: AsyncSession,
+):
+    return await vote(user_id, decision_id, True, db)
 
 
 async def dislike(
@@ -50,64 +102,59 @@ async def dislike(
     decision_id: int,
     db: AsyncSession,
 ):
-   
-    vote = await db.scalar(
-        select(DecisionVoteModel).where(
-            DecisionVoteModel.user_id == user_id,
-            DecisionVoteModel.decision_id == decision_id,
-        )
+    return await vote(user_id, decision_id, False, db)
+
+
+async def my_decision_votes(db: AsyncSession, user_id: int | None, decision_ids) -> dict[int, bool]:
+    """
+    Голоса пользователя на странице решений одним запросом: {decision_id: is_like}
+    """
+    if user_id is None or not decision_ids:
+        return {}
+    rows = await db.execute(
+        select(DecisionVoteModel.decision_id, DecisionVoteModel.is_like)
+        .where(DecisionVoteModel.user_id == user_id, DecisionVoteModel.decision_id.in_(decision_ids))
     )
-    
-    if vote:
-        if not vote.is_like:
-            # Уже дизлайк → убираем
-            await db.delete(vote)
-            await db.commit()
-            return None  
-        else:
-            # Лайк → меняем на дизлайк
-            vote.is_like = False
-            await db.commit()
-            await db.refresh(vote)
-            return False
-    else:
-        # Нет голоса → создаём дизлайк
-        vote = DecisionVoteModel(
-            user_id=user_id,
-            decision_id=decision_id,
-            is_like=False
-        )
-        db.add(vote)  
-        await db.commit()
-        await db.refresh(vote)
-        return False
-    
+    return dict(rows.all())
+
+
+async def my_comment_votes(db: AsyncSession, user_id: int | None, comment_ids) -> dict[int, bool]:
+    """
+    То же для комментариев: {comment_id: is_like}
+    """
+    if user_id is None or not comment_ids:
+        return {}
+    rows = await db.execute(
+        select(CommentVoteModel.comment_id, CommentVoteModel.is_like)
+        .where(CommentVoteModel.user_id == user_id, CommentVoteModel.comment_id.in_(comment_ids))
+    )
+    return dict(rows.all())
+
+
+# статус решения -> счетчик в users
+DECISION_COUNTERS = {
+    "ready": "decisions_taken",
+    "in_processing": "unaccepted_decisions",
+}
+
+
+def decision_counters(user_id: int, **deltas: int):
+    """
+    UPDATE счетчиков решений пользователя, ключи - статусы решений:
+    decision_counters(1, in_processing=-1, ready=1)
+    """
+    values = {}
+    for decision_status, delta in deltas.items():
+        column = getattr(UserModel, DECISION_COUNTERS[decision_status])
+        values[column] = column + delta
+    return update(UserModel).where(UserModel.id == user_id).values(values)
 
 
 @shared_task
 def decision_making(decision_id: int):
     db = SyncSessionLocal()
     try:
-        stmt = (
-            select(
-                DecisionModel,
-                func.count(DecisionVoteModel.user_id)
-                .filter(DecisionVoteModel.is_like.is_(True))
-                .label("like"),
-                func.count(DecisionVoteModel.user_id)
-                .filter(DecisionVoteModel.is_like.is_(False))
-                .label("dislike"),
-            )
-            .outerjoin(DecisionModel.votes)
-            .where(
-                DecisionModel.id == decision_id,
-                DecisionModel.is_active.is_(True),
-            )
-            .group_by(DecisionModel.id)
-        )
-
-        result = db.execute(stmt)
-        row = result.first()
+        row = decision_with_votes_sync(db, decision_id)
 
         if row is None:
             # лучше не кидать HTTPException в таске, см. ниже
@@ -125,6 +172,9 @@ def decision_making(decision_id: int):
             decision_id=decision.id,
         )
 
+        if decision.status == "in_processing":
+            db.execute(decision_counters(decision.user_id, in_processing=-1, ready=1))
+            record_accepted(db, decision.user_id)
         decision.status = "ready"
         db.add(decision_history)
         db.commit()
@@ -134,6 +184,48 @@ def decision_making(decision_id: int):
 
 
 
+@shared_task
+def recount_decision_counters():
+    """
+    Пересчитывает счетчики решений всех пользователей с нуля.
+    Для заполнения после добавления колонок и исправления расхождений
+    """
+    db = SyncSessionLocal()
+    try:
+        def count(decision_status: str):
+            return (
+                select(func.count())
+                .where(
+                    DecisionModel.user_id == UserModel.id,
+                    DecisionModel.is_active.is_(True),
+                    DecisionModel.status == decision_status,
+                )
+                .scalar_subquery()
+            )
+        db.execute(update(UserModel).values(
+            {getattr(UserModel, column): count(decision_status) for decision_status, column in DECISION_COUNTERS.items()}
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+@shared_task
+def recount_hot_scores():
+    """
+    Пересчитывает net_votes и hot_score всех решений из голосов и заново заполняет индекс trending.
+    Только вручную (переписывает всю таблицу decisions): голоса, ушедшие мимо vote(),
+    пересчитывает на месте archive.rescore_decisions
+    """
+    db = SyncSessionLocal()
+    try:
+        recount_scores(db)
+        db.commit()
+        replace_scores_sync(db)
+    finally:
+        db.close()
+
+
 async def like_comment(user_id, comment_id, db : AsyncSession):
     comment_vote = await db.scalar(
         select(CommentVoteModel)
@@ -154,6 +246,7 @@ async def like_comment(user_id, comment_id, db : AsyncSession):
         )
         db.add(like_comment)
 
+    await db.execute(bump_version(select(CommentModel.decision_id).where(CommentModel.id == comment_id)))
     await db.commit()
     return {"status" : "ok"}
    
@@ -176,6 +269,7 @@ async def dislike_comment(user_id, comment_id, db : AsyncSession):
         )
         db.add(dislike_comment)
 
+    await db.execute(bump_version(select(CommentModel.decision_id).where(CommentModel.id == comment_id)))
     await db.commit()
     return {"status" : "ok"} 
     
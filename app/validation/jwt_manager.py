@@ -16,6 +16,7 @@ import jwt
 from datetime import datetime, timedelta,timezone
  
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/token", auto_error=False)
 
 class JWTManager:
     def __init__(self, algorithm, secret_key, acces_token_expire_minutes, refresh_token_expire_days) :
@@ -78,6 +79,14 @@ class JWTManager:
         if user is None: #если юзера нет в бд  
             raise credentals_exception
         return user
+
+    async def get_current_user_optional(self, token : str | None = Depends(optional_oauth2_scheme), db : AsyncSession = Depends(get_async_db)):
+        """
+        Для открытых ручек: None без токена, с токеном - как get_current_user
+        """
+        if token is None:
+            return None
+        return await self.get_current_user(token, db)
     
     async def verify_refresh_token(self, token : RefreshToken, db : AsyncSession = Depends(get_async_db)):  
         credentals_exception = HTTPException(
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from celery import shared_task
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import SyncSessionLocal
+from app.models import DecisionVoteModel, DecisionVoteHourModel
+
+
+def vote_hour_upsert(decision_id: int, voted_at, likes: int, dislikes: int):
+    """
+    Сдвиг счетчиков в часовой корзине голоса. voted_at - created_at голоса
+    или func.now() для нового: снятый или измененный голос правит корзину, в которой был поставлен
+    """
+    stmt = pg_insert(DecisionVoteHourModel).values(
+        decision_id=decision_id,
+        hour=func.date_trunc("hour", voted_at),
+        likes=likes,
+        dislikes=dislikes,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[DecisionVoteHourModel.decision_id, DecisionVoteHourModel.hour],
+        set_={
+            "likes": DecisionVoteHourModel.likes + stmt.excluded.likes,
+            "dislikes": DecisionVoteHourModel.dislikes + stmt.excluded.dislikes,
+        },
+    )
+
+
+def rebuild_vote_hours(db, decision_ids=None) -> None:
+    """
+    Пересобирает корзины из голосов: всех решений или только decision_ids
+    """
+    hour = func.date_trunc("hour", DecisionVoteModel.created_at)
+    source = (
+        select(
+            DecisionVoteModel.decision_id,
+            hour,
+            func.count().filter(DecisionVoteModel.is_like.is_(True)),
+            func.count().filter(DecisionVoteModel.is_like.is_(False)),
+        )
+        .group_by(DecisionVoteModel.decision_id, hour)
+    )
+    clear = delete(DecisionVoteHourModel)
+    if decision_ids is not None:
+        source = source.where(DecisionVoteModel.decision_id.in_(decision_ids))
+        clear = clear.where(DecisionVoteHourModel.decision_id.in_(decision_ids))
+    db.execute(clear)
+    db.execute(insert(DecisionVoteHourModel).from_select(["decision_id", "hour", "likes", "dislikes"], source))
+
+
+@shared_task
+def rebuild_decision_vote_hours():
+    """
+    Полная пересборка, только вручную: заполнение после добавления таблицы.
+    Голоса, ушедшие мимо vote() (удаление пользователя, архивация), пересобираются на месте
+    по своим решениям. Пока идет полная пересборка, первый голос в новой корзине
+    упадет на уникальном ключе - запускать в тихое время
+    """
+    db = SyncSessionLocal()
+    try:
+        rebuild_vote_hours(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def vote_timeline(db: AsyncSession, decision_id: int, hours: int) -> tuple[datetime, list]:
+    """
+    Корзины решения за последние hours часов, не больше hours строк
+    """
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+    result = await db.scalars(
+        select(DecisionVoteHourModel)
+        .where(DecisionVoteHourModel.decision_id == decision_id, DecisionVoteHourModel.hour >= since)
+        .order_by(DecisionVoteHourModel.hour)
+    )
+    return since, result.all()
@@ -0,0 +1,94 @@
+"""
+Сравнение путей сериализации страницы решений:
+
+    python -m benchmarks.serialization --items 50
+
+response_model   - как раньше: DecisionSchema на каждую строку, затем FastAPI
+                   проверяет ответ по response_model и пишет его в JSON
+jsonable_encoder - путь FastAPI без dump_json: jsonable_encoder + json.dumps
+json_response    - app.serialization: одна проверка словарей и запись в байты
+orjson           - то же, но байты пишет orjson (если установлен)
+"""
+import argparse
+import asyncio
+import timeit
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.schemas.decisions import DecisionSchema
+from app.serialization import json_response, decision_item, DECISION_LIST
+
+
+def make_rows(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        (
+            SimpleNamespace(
+                id=index + 1,
+                title=f"Решение номер {index}",
+                description="Длинное описание решения. " * 20,
+                image_url="/media/decision.png",
+                image_variants=None,
+                user_id=3,
+                created_at=now,
+                updated_at=now,
+                status="in_processing",
+                is_active=True,
+            ),
+            index % 7,
+            index % 3,
+        )
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сериализация страницы решений")
+    parser.add_argument("--items", type=int, default=50, help="решений на странице")
+    parser.add_argument("--number", type=int, default=300, help="прогонов в одном замере")
+    args = parser.parse_args()
+
+    rows = make_rows(args.items)
+    field = create_model_field(name="Response", type_=list[DecisionSchema], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def schemas():
+        return [DecisionSchema(**decision_item(decision, like, dislike)) for decision, like, dislike in rows]
+
+    def response_model():
+        body = loop.run_until_complete(serialize_response(field=field, response_content=schemas(), dump_json=True))
+        return Response(body, media_type="application/json")
+
+    def encoder():
+        content = loop.run_until_complete(serialize_response(field=field, response_content=schemas()))
+        return JSONResponse(content)
+
+    def fast():
+        return json_response(DECISION_LIST, [decision_item(decision, like, dislike) for decision, like, dislike in rows])
+
+    cases = {"response_model": response_model, "jsonable_encoder": encoder, "json_response": fast}
+    try:
+        import orjson
+
+        def with_orjson():
+            items = DECISION_LIST.validate_python([decision_item(decision, like, dislike) for decision, like, dislike in rows])
+            return Response(orjson.dumps(DECISION_LIST.dump_python(items)), media_type="application/json")
+
+        cases["orjson"] = with_orjson
+    except ImportError:
+        pass
+
+    baseline = None
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=args.number, repeat=7)) / args.number
+        baseline = baseline or seconds
+        print(f"{name:<18}{seconds * 1e6:>9.1f} мкс  x{baseline / seconds:.2f}")
+
+
+if __name__ == "__main__":
+    main()
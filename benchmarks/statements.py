@@ -0,0 +1,128 @@
+"""
+Сколько стоит подготовить запрос решений с голосами на один HTTP запрос:
+
+    python -m benchmarks.statements
+
+before - как раньше: select(...) собирается в ручке, при выполнении SQLAlchemy
+         считает по нему ключ кеша компиляции
+after  - app.decision_repo: готовый statement со своими bindparam, ключ кеша
+         посчитан один раз и запомнен
+
+SQL в обоих случаях берется из кеша компиляции, поэтому сравнивается только сборка и ключ
+"""
+import os
+import argparse
+import timeit
+
+# app.database создает движки при импорте, к базе бенчмарк не подключается
+os.environ.setdefault("DATABASE_URL", "postgresql+asyncpg://unused@127.0.0.1/unused")
+os.environ.setdefault("SYNC_DATABASE_URL", "sqlite://")
+
+from sqlalchemy import select, func, or_
+
+from app.models import DecisionModel, DecisionVoteModel
+from app import decision_repo
+
+
+def old_with_votes():
+    return (
+        select(
+            DecisionModel,
+
+            func.count(DecisionVoteModel.user_id)
+            .filter(DecisionVoteModel.is_like.is_(True))
+            .label("like"),
+
+            func.count(DecisionVoteModel.user_id)
+            .filter(DecisionVoteModel.is_like.is_(False))
+            .label("dislike"),
+        )
+        .outerjoin(DecisionModel.votes)
+    )
+
+
+def old_by_id(decision_id: int):
+    return (
+        old_with_votes()
+        .where(DecisionModel.id == decision_id, DecisionModel.is_active.is_(True))
+        .group_by(DecisionModel.id)
+    )
+
+
+def old_user_decisions(user_id: int, last_id: int):
+    filters = [
+        DecisionModel.is_active == True,
+        DecisionModel.user_id == user_id,
+        DecisionModel.status == "ready",
+        DecisionModel.id > last_id,
+    ]
+    return (
+        old_with_votes()
+        .where(*filters)
+        .group_by(DecisionModel.id)
+        .order_by(DecisionModel.created_at.asc())
+        .limit(30)
+    )
+
+
+def old_search(search_value: str, page: int):
+    ts_query_ru = func.websearch_to_tsquery("russian", search_value)
+    ts_query_en = func.websearch_to_tsquery("english", search_value)
+    filters = [
+        DecisionModel.is_active.is_(True),
+        or_(
+            DecisionModel.tsv.op("@@")(ts_query_ru),
+            DecisionModel.tsv.op("@@")(ts_query_en),
+            DecisionModel.title.op("%")(search_value),
+            func.similarity(DecisionModel.title, search_value) > 0.15,
+        ),
+    ]
+    rank = func.greatest(
+        func.ts_rank_cd(DecisionModel.tsv, ts_query_ru),
+        func.ts_rank_cd(DecisionModel.tsv, ts_query_en),
+        func.similarity(DecisionModel.title, search_value) * 0.5,
+    )
+    return (
+        old_with_votes()
+        .where(*filters)
+        .group_by(DecisionModel.id)
+        .limit(20)
+        .offset((page - 1) * 20)
+        .order_by(rank.desc())
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подготовка запросов решений")
+    parser.add_argument("--number", type=int, default=2000, help="прогонов в одном замере")
+    args = parser.parse_args()
+
+    cases = {
+        "по id": (
+            lambda: old_by_id(42)._generate_cache_key(),
+            lambda: decision_repo.BY_ID._generate_cache_key(),
+        ),
+        "решения пользователя": (
+            lambda: old_user_decisions(3, 100)._generate_cache_key(),
+            lambda: decision_repo.user_decisions_stmt(True, ())._generate_cache_key(),
+        ),
+        "поиск": (
+            lambda: old_search("голосование", 2)._generate_cache_key(),
+            lambda: decision_repo.search_stmt(True, False, ())._generate_cache_key(),
+        ),
+    }
+
+    print(f"{'':<22}{'before':>12}{'after':>12}")
+    for name, (before, after) in cases.items():
+        before_seconds, after_seconds = (
+            min(timeit.repeat(case, number=args.number, repeat=7)) / args.number
+            for case in (before, after)
+        )
+        print(
+            f"{name:<22}{before_seconds * 1e6:>8.1f} мкс{after_seconds * 1e6:>8.1f} мкс"
+            f"  x{before_seconds / after_seconds:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
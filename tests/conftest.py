@@ -0,0 +1,11 @@
+import os
+
+
+# app.database создает движки при импорте, соединения открываются только при запросе.
+# Тестам без базы хватит адресов-заглушек, тесты с PostgreSQL берут TEST_DATABASE_URL
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+os.environ.setdefault("DATABASE_URL", TEST_DATABASE_URL or "postgresql+asyncpg://unused@127.0.0.1/unused")
+os.environ.setdefault("SYNC_DATABASE_URL", "sqlite://")
+os.environ.setdefault("TRENDING_BACKEND", "memory")
+os.environ.setdefault("SECRET_KEY", "test")
@@ -0,0 +1,143 @@
+"""
+DataLoader на SQLite в памяти (aiosqlite) с отдельной моделью: считаем запросы к базе
+"""
+import gc
+import asyncio
+
+import pytest
+from sqlalchemy import event, String
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from app.dataloader import Loaders
+
+
+pytest.importorskip("aiosqlite")
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class ItemModel(Base):
+    __tablename__ = "items"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(20))
+
+
+class MissingModel(Base):
+    # таблица не создается: запрос к ней падает
+    __tablename__ = "missing"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+
+def run(scenario):
+    """
+    Запускает scenario(loaders, statements) с сессией над таблицей items (id 1..5).
+    statements - SQL запросов к items после заполнения, errors - исключения, дошедшие до цикла событий
+    """
+    async def main():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        engine = create_async_engine("sqlite+aiosqlite://")
+        try:
+            async with engine.begin() as connection:
+                await connection.run_sync(ItemModel.metadata.create_all, tables=[ItemModel.__table__])
+            async with AsyncSession(engine) as db:
+                db.add_all(ItemModel(id=number, name=f"item {number}") for number in range(1, 6))
+                await db.commit()
+                db.expunge_all()
+
+                statements = []
+                event.listen(
+                    engine.sync_engine, "before_cursor_execute",
+                    lambda conn, cursor, statement, *args: statements.append(statement),
+                )
+                await scenario(Loaders(db), statements)
+        finally:
+            await engine.dispose()
+        gc.collect() #"never retrieved" пишется при сборке задачи
+        await asyncio.sleep(0)
+        return errors
+
+    return asyncio.run(main())
+
+
+def test_gathered_loads_share_one_in_query():
+    async def scenario(loaders, statements):
+        rows = await asyncio.gather(
+            loaders.load(ItemModel, 3),
+            loaders.load(ItemModel, 1),
+            loaders.load(ItemModel, 3),
+            loaders.load(ItemModel, 42),
+        )
+        assert [row and row.name for row in rows] == ["item 3", "item 1", "item 3", None]
+        assert rows[0] is rows[2]
+        assert len(statements) == 1
+        assert " IN " in statements[0]
+
+        # закешированный ключ - без запроса, новый - своим запросом
+        assert (await loaders.load(ItemModel, 1)).name == "item 1"
+        assert len(statements) == 1
+        assert [row.id for row in await loaders.load_many(ItemModel, [4, 5])] == [4, 5]
+        assert len(statements) == 2
+
+    assert run(scenario) == []
+
+
+def test_rows_in_session_are_loaded_without_query():
+    async def scenario(loaders, statements):
+        item = await loaders.db.get(ItemModel, 2)
+        statements.clear()
+        assert await loaders.load(ItemModel, 2) is item
+        assert statements == []
+
+    assert run(scenario) == []
+
+
+def test_error_reaches_every_waiter_and_is_not_logged():
+    async def scenario(loaders, statements):
+        results = await asyncio.gather(
+            loaders.load(MissingModel, 1),
+            loaders.load(MissingModel, 2),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, Exception) for result in results)
+        assert results[0] is results[1]
+        # после ошибки ключи не закешированы: следующая загрузка пойдет новым запросом
+        assert loaders(MissingModel).cache == {}
+
+    assert run(scenario) == []
+
+
+def test_cancelled_waiter_does_not_cancel_load_for_others():
+    async def scenario(loaders, statements):
+        first = asyncio.ensure_future(loaders.load(ItemModel, 4))
+        second = asyncio.ensure_future(loaders.load(ItemModel, 4))
+        await asyncio.sleep(0) #оба ждут одну загрузку
+        first.cancel()
+        assert (await second).name == "item 4"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert len(statements) == 1
+
+    assert run(scenario) == []
+
+
+def test_cancelled_dispatch_cancels_waiters():
+    async def scenario(loaders, statements):
+        async with loaders.lock: #сессия занята: загрузка ждет блокировку, запрос не начат
+            waiter = asyncio.ensure_future(loaders.load(ItemModel, 5))
+            for _ in range(3):
+                await asyncio.sleep(0)
+            (task,) = loaders(ItemModel).tasks
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        assert loaders(ItemModel).cache == {}
+        assert statements == []
+        assert (await loaders.load(ItemModel, 5)).name == "item 5"
+
+    assert run(scenario) == []
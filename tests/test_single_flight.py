@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.single_flight import SingleFlight, FLIGHTS, single_flight_stats
+
+
+@pytest.fixture
+def flight():
+    flight = SingleFlight("test")
+    yield flight
+    FLIGHTS.pop("test", None)
+
+
+class Loader:
+    """
+    load для SingleFlight.do: считает запуски и ждет release, чтобы вызовы успели встретиться
+    """
+
+    def __init__(self, result=None, error: Exception | None = None):
+        self.result = result if result is not None else {"value": 1}
+        self.error = error
+        self.started = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_load(flight):
+    async def scenario():
+        load = Loader()
+        calls = [asyncio.ensure_future(flight.do(("decision", 1), load)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.stats()["in_flight"] == 1
+        load.release.set()
+        results = await asyncio.gather(*calls)
+        assert load.started == 1
+        assert all(result is load.result for result in results)
+        assert flight.stats() == {"calls": 3, "shared": 2, "in_flight": 0, "ratio": 0.6667}
+
+        # результат не кешируется: следующий вызов - новая загрузка
+        again = Loader()
+        again.release.set()
+        assert await flight.do(("decision", 1), again) is again.result
+        assert again.started == 1
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_load_separately(flight):
+    async def scenario():
+        first, second = Loader({"id": 1}), Loader({"id": 2})
+        first.release.set()
+        second.release.set()
+        results = await asyncio.gather(flight.do(("decision", 1), first), flight.do(("decision", 2), second))
+        assert results == [{"id": 1}, {"id": 2}]
+        assert flight.stats()["shared"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_leader_does_not_cancel_others(flight):
+    async def scenario():
+        load = Loader()
+        leader = asyncio.ensure_future(flight.do(("decision", 1), load))
+        follower = asyncio.ensure_future(flight.do(("decision", 1), load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        load.release.set()
+        assert await follower is load.result
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert load.started == 1
+
+    asyncio.run(scenario())
+
+
+def test_exception_reaches_every_waiter(flight):
+    async def scenario():
+        load = Loader(error=LookupError("нет решения"))
+        calls = [asyncio.ensure_future(flight.do(("decision", 1), load)) for _ in range(2)]
+        await asyncio.sleep(0)
+        load.release.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        assert [type(result) for result in results] == [LookupError, LookupError]
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_stats_without_calls(flight):
+    assert flight.stats() == {"calls": 0, "shared": 0, "in_flight": 0, "ratio": 0.0}
+    assert single_flight_stats()["test"] == flight.stats()
@@ -0,0 +1,255 @@
+"""
+Хранилища картинок: LocalStorage во временной папке и S3Storage с клиентом-заглушкой в памяти,
+которая ведет себя как S3/MinIO в том, что использует приложение
+"""
+import os
+import time
+import asyncio
+import hashlib
+import base64
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app import media
+from app.storage import LocalStorage, S3Storage
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+JPG = b"\xff\xd8\xff" + b"\x01" * 100
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self) -> bytes:
+        return self.data
+
+
+class FakeS3Client:
+    """
+    Бакет в памяти: key -> (тело, content_type, LastModified). Каждая запись сдвигает часы на секунду
+    """
+
+    def __init__(self):
+        self.objects: dict[str, tuple[bytes, str, datetime]] = {}
+        self.clock = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.calls: list[str] = []
+
+    def _tick(self) -> datetime:
+        self.clock += timedelta(seconds=1)
+        return self.clock
+
+    @staticmethod
+    def _error(code: str, operation: str):
+        from botocore.exceptions import ClientError
+        return ClientError({"Error": {"Code": code}}, operation)
+
+    async def head_object(self, Bucket, Key):
+        self.calls.append("head_object")
+        if Key not in self.objects:
+            raise self._error("404", "HeadObject")
+        body, _, last_modified = self.objects[Key]
+        return {"ContentLength": len(body), "LastModified": last_modified}
+
+    async def put_object(self, Bucket, Key, Body, ContentType):
+        self.calls.append("put_object")
+        self.objects[Key] = (Body, ContentType, self._tick())
+
+    async def copy_object(self, Bucket, Key, CopySource, MetadataDirective="COPY", ContentType=None):
+        self.calls.append("copy_object")
+        if CopySource == {"Bucket": Bucket, "Key": Key} and MetadataDirective != "REPLACE":
+            # как S3: копия на себя без изменений запрещена
+            raise self._error("InvalidRequest", "CopyObject")
+        body, content_type, _ = self.objects[CopySource["Key"]]
+        self.objects[Key] = (body, ContentType or content_type, self._tick())
+
+    async def get_object(self, Bucket, Key, Range=None):
+        self.calls.append("get_object")
+        body = self.objects[Key][0]
+        if Range is not None:
+            start, end = Range.removeprefix("bytes=").split("-")
+            body = body[int(start):int(end) + 1]
+        return {"Body": FakeBody(body)}
+
+    async def delete_object(self, Bucket, Key):
+        self.calls.append("delete_object")
+        self.objects.pop(Key, None)
+
+    async def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.calls.append("generate_presigned_url")
+        return f"https://s3.example/{Params['Bucket']}/{Params['Key']}?op={operation}&expires={ExpiresIn}"
+
+
+@pytest.fixture
+def s3():
+    pytest.importorskip("aiobotocore", reason="S3Storage нужен aiobotocore, см. requirements-s3.txt")
+    storage = S3Storage(bucket="media", public_url="https://cdn.example/decisions/")
+    storage._client = FakeS3Client()
+    return storage
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalStorage(tmp_path, "/media/decisions")
+
+
+def staged(storage, data: bytes) -> str:
+    path = os.path.join(storage.staging_dir, f"upload-{time.monotonic_ns()}.part")
+    with open(path, "wb") as file:
+        file.write(data)
+    return path
+
+
+def image_key(data: bytes, extension: str) -> str:
+    return media.content_key(hashlib.sha256(data).hexdigest(), extension)
+
+
+def test_s3_put_file_uploads_and_removes_temp(s3):
+    key = image_key(PNG, ".png")
+    tmp_name = staged(s3, PNG)
+    asyncio.run(s3.put_file(key, tmp_name, "image/png"))
+    assert not os.path.exists(tmp_name)
+    assert s3._client.objects[key][:2] == (PNG, "image/png")
+    assert asyncio.run(s3.stat(key))[0] == len(PNG)
+
+
+def test_s3_put_file_existing_object_is_touched_not_uploaded(s3):
+    key = image_key(PNG, ".png")
+    asyncio.run(s3.put_file(key, staged(s3, PNG), "image/png"))
+    before = asyncio.run(s3.stat(key))[1]
+    s3._client.calls.clear()
+    tmp_name = staged(s3, PNG)
+    asyncio.run(s3.put_file(key, tmp_name, "image/png"))
+    assert "put_object" not in s3._client.calls
+    assert "copy_object" in s3._client.calls
+    assert asyncio.run(s3.stat(key))[1] > before
+    assert not os.path.exists(tmp_name)
+
+
+def test_s3_stat_missing_and_other_errors(s3):
+    from botocore.exceptions import ClientError
+    assert asyncio.run(s3.stat("ab/cd/missing.png")) is None
+
+    async def forbidden(Bucket, Key):
+        raise FakeS3Client._error("403", "HeadObject")
+
+    s3._client.head_object = forbidden
+    with pytest.raises(ClientError):
+        asyncio.run(s3.stat("ab/cd/missing.png"))
+
+
+def test_s3_read_head_uses_range(s3):
+    key = image_key(JPG, ".jpg")
+    asyncio.run(s3.put_file(key, staged(s3, JPG), "image/jpeg"))
+    assert asyncio.run(s3.read_head(key, media.SIGNATURE_SIZE)) == JPG[:media.SIGNATURE_SIZE]
+
+
+def test_s3_urls_and_delete(s3):
+    key = image_key(PNG, ".png")
+    url = s3.url_for_key(key)
+    assert url == f"https://cdn.example/decisions/{key}"
+    assert s3.key_for_url(url) == key
+    assert s3.key_for_url("https://other.example/x.png") is None
+    asyncio.run(s3.put_file(key, staged(s3, PNG), "image/png"))
+    asyncio.run(s3.delete(key))
+    assert asyncio.run(s3.stat(key)) is None
+
+
+def test_s3_presign_upload_signs_type_size_and_checksum(s3):
+    checksum = base64.b64encode(hashlib.sha256(PNG).digest()).decode()
+    upload = asyncio.run(s3.presign_upload("ab/cd/key.png", "image/png", len(PNG), checksum))
+    assert upload["method"] == "PUT"
+    assert upload["url"].startswith("https://s3.example/media/ab/cd/key.png?op=put_object")
+    assert upload["headers"] == {
+        "Content-Type": "image/png",
+        "Content-Length": str(len(PNG)),
+        "x-amz-checksum-sha256": checksum,
+    }
+    assert upload["expires_at"] > time.time()
+
+
+def test_presign_image_upload_dedup_touches_existing(s3, monkeypatch):
+    monkeypatch.setattr(media, "storage", s3)
+    digest = hashlib.sha256(PNG).hexdigest()
+    fresh = asyncio.run(media.presign_image_upload(digest, len(PNG), "image/png"))
+    assert fresh["upload"]["method"] == "PUT"
+
+    key = fresh["image_key"]
+    asyncio.run(s3.put_file(key, staged(s3, PNG), "image/png"))
+    before = asyncio.run(s3.stat(key))[1]
+    again = asyncio.run(media.presign_image_upload(digest, len(PNG), "image/png"))
+    assert again == {"image_key": key, "upload": None}
+    assert asyncio.run(s3.stat(key))[1] > before
+
+
+def test_resolve_uploaded_image_checks_signature(s3, monkeypatch):
+    monkeypatch.setattr(media, "storage", s3)
+    key = image_key(PNG, ".png")
+    with pytest.raises(HTTPException) as missing:
+        asyncio.run(media.resolve_uploaded_image(key))
+    assert missing.value.status_code == 400
+
+    asyncio.run(s3.put_file(key, staged(s3, PNG), "image/png"))
+    assert asyncio.run(media.resolve_uploaded_image(key)) == s3.url_for_key(key)
+
+    # под ключом .png залит jpeg
+    wrong = image_key(JPG, ".png")
+    asyncio.run(s3.put_file(wrong, staged(s3, JPG), "image/png"))
+    with pytest.raises(HTTPException) as mismatch:
+        asyncio.run(media.resolve_uploaded_image(wrong))
+    assert mismatch.value.status_code == 400
+
+    with pytest.raises(HTTPException):
+        asyncio.run(media.resolve_uploaded_image("../etc/passwd.png"))
+
+
+def test_local_put_file_stat_read_head_delete(local):
+    key = image_key(PNG, ".png")
+    tmp_name = staged(local, PNG)
+    asyncio.run(local.put_file(key, tmp_name, "image/png"))
+    assert not os.path.exists(tmp_name)
+    assert local.path(key).read_bytes() == PNG
+    assert asyncio.run(local.stat(key))[0] == len(PNG)
+    assert asyncio.run(local.read_head(key, media.SIGNATURE_SIZE)) == PNG[:media.SIGNATURE_SIZE]
+    asyncio.run(local.delete(key))
+    assert asyncio.run(local.stat(key)) is None
+    asyncio.run(local.delete(key)) #повторное удаление не падает
+
+
+def test_local_put_file_existing_is_touched(local):
+    key = image_key(PNG, ".png")
+    asyncio.run(local.put_file(key, staged(local, PNG), "image/png"))
+    os.utime(local.path(key), (0, 0))
+    tmp_name = staged(local, PNG)
+    asyncio.run(local.put_file(key, tmp_name, "image/png"))
+    assert not os.path.exists(tmp_name)
+    assert asyncio.run(local.stat(key))[1] > time.time() - 60
+
+    os.utime(local.path(key), (0, 0))
+    asyncio.run(local.touch(key, "image/png"))
+    assert asyncio.run(local.stat(key))[1] > time.time() - 60
+
+
+def test_local_urls_stay_inside_root(local):
+    key = image_key(PNG, ".png")
+    assert local.key_for_url(local.url_for_key(key)) == key
+    assert local.key_for_url("/media/decisions/../../secret.png") is None
+    assert local.key_for_url("/other/x.png") is None
+    assert local.key_for_url("") is None
+
+
+def test_local_has_no_direct_upload(local, monkeypatch):
+    assert asyncio.run(local.presign_upload("ab/cd/key.png", "image/png", 10, "x")) is None
+    monkeypatch.setattr(media, "storage", local)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(media.presign_image_upload(hashlib.sha256(PNG).hexdigest(), len(PNG), "image/png"))
+    assert error.value.status_code == 400